@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+'''
+Benchmarks building cold routers from many threads at once, like the first
+requests to a threaded server after a restart.
+
+Run from the project root (it uses the test settings):
+
+    python3 benchmarks/bench_router.py
+
+Each view module sleeps while it is imported to stand in for a slow import.
+The "global lock" row wraps get_router() in one lock, which is how routers
+were built before they had per-key locks.
+'''
+import os, sys, time, tempfile, threading
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import django
+
+THREADS = 16
+IMPORT_SECONDS = 0.05
+
+VIEW_MODULE = '''
+import time
+from django.http import HttpResponse
+from django_mako_plus import view_function
+
+time.sleep({})
+
+@view_function
+def process_request(request, i:int=0):
+    return HttpResponse('bench')
+'''
+
+
+def main():
+    os.environ['DJANGO_SETTINGS_MODULE'] = 'tests.settings'
+    django.setup()
+
+    from django_mako_plus import router
+
+    # view modules that are slow to import, two sets so each run starts cold
+    tempdir = tempfile.mkdtemp()
+    sys.path.insert(0, tempdir)
+    for run in ( 'global', 'perkey' ):
+        for i in range(THREADS):
+            with open(os.path.join(tempdir, 'bench_view_{}_{}.py'.format(run, i)), 'w') as fout:
+                fout.write(VIEW_MODULE.format(IMPORT_SECONDS))
+
+    global_lock = threading.RLock()
+    def global_get_router(module_name):
+        with global_lock:
+            return router.get_router(module_name, 'process_request')
+
+    def per_key_get_router(module_name):
+        return router.get_router(module_name, 'process_request')
+
+    print('{} threads, {} distinct cold views, {:.0f} ms per import'.format(THREADS, THREADS, IMPORT_SECONDS * 1000))
+    print('{:24} {:>12}'.format('locking', 'total ms'))
+    for name, run, get_router in ( ( 'global lock', 'global', global_get_router ), ( 'per-key locks', 'perkey', per_key_get_router ) ):
+        threads = [ threading.Thread(target=get_router, args=( 'bench_view_{}_{}'.format(run, i), )) for i in range(THREADS) ]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        print('{:24} {:>12.1f}'.format(name, (time.perf_counter() - start) * 1000))
+
+
+if __name__ == '__main__':
+    main()
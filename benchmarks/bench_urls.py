@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+'''
+Benchmarks DMP url resolution: the single-pass pattern vs. the six regex patterns.
+
+Run from the project root (it uses the test settings):
+
+    python3 benchmarks/bench_urls.py
+
+Each line shows the time per resolve, in microseconds.
+'''
+import os, sys, timeit
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import django
+
+ITERATIONS = 20000
+
+
+def main():
+    os.environ['DJANGO_SETTINGS_MODULE'] = 'tests.settings'
+    django.setup()
+
+    try:
+        from django.urls.resolvers import RegexURLResolver        # Django 1.10+
+    except ImportError:
+        from django.core.urlresolvers import RegexURLResolver     # Django 1.9
+    from django_mako_plus.urls import urlpatterns, DMPPathPattern
+
+    # the regex patterns after the single-pass pattern
+    REGEX_PATTERNS = urlpatterns[[ isinstance(p, DMPPathPattern) for p in urlpatterns ].index(True) + 1:]
+
+    # a url conf can be a plain list of patterns
+    resolvers = [
+        ( 'regex', RegexURLResolver(r'^/', REGEX_PATTERNS) ),
+        ( 'single-pass', RegexURLResolver(r'^/', urlpatterns) ),
+    ]
+    paths = [
+        '/',
+        '/tests',
+        '/tests/index',
+        '/tests/index/1/2/3/',
+        '/tests/index.basic/1/2/3/',
+        '/index.basic/1/2/3/',      # not a DMP app: falls through the app patterns
+        '/index/1/2/3/',
+    ]
+    print('{:32} {:>12} {:>12}'.format('path', *( name for name, resolver in resolvers )))
+    for path in paths:
+        times = []
+        for name, resolver in resolvers:
+            resolver.resolve(path)  # warm up
+            seconds = timeit.timeit(lambda: resolver.resolve(path), number=ITERATIONS)
+            times.append(seconds / ITERATIONS * 1000000)
+        print('{:32} {:>12.2f} {:>12.2f}'.format(path, *times))
+
+
+if __name__ == '__main__':
+    main()
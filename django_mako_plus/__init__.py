@@ -19,12 +19,12 @@ from .apps import Config
 
 # the router and middleware
 from .middleware import RequestInitMiddleware
-from .router import route_request
+from .router import route_request, route_request_async
 
 
 # view_function decorator and converter classes
 from .router import view_function
-from .converter import DefaultConverter, set_default_converter, get_default_converter
+from .converter import DefaultConverter, ModelQuery, set_default_converter, get_default_converter
 
 
 # the middleware and template
@@ -77,6 +77,7 @@ from .static_files import link_css
 from .static_files import link_js
 from .static_files import link_template_css
 from .static_files import link_template_js
+from .static_files import serve_static
 # these are deprecated as of Jan 2017 and can be removed at some point
 from .static_files import get_template_css
 from .static_files import get_template_js
@@ -2,6 +2,7 @@ from django.apps import AppConfig
 from django.conf import settings
 from django.template import engines
 
+from .model_cache import ModelCache
 from .util import get_dmp_instance, log, DMP_OPTIONS
 
 
@@ -18,5 +19,17 @@ class Config(AppConfig):
         # See the creation of EngineHandler.default_name in django.templates.util for this.
         engines['django_mako_plus']
 
+        # the opt-in, cross-request cache for the default converter's model lookups
+        # this is set up here rather than in the engine because it needs the models to be loaded
+        DMP_OPTIONS['RUNTIME_CONVERTER_CACHE'] = None
+        if DMP_OPTIONS.get('CONVERTER_CACHE_MODELS'):
+            DMP_OPTIONS['RUNTIME_CONVERTER_CACHE'] = ModelCache(
+                DMP_OPTIONS['CONVERTER_CACHE_MODELS'],
+                cache_alias=DMP_OPTIONS.get('CONVERTER_CACHE_ALIAS', 'default'),
+                timeout=DMP_OPTIONS.get('CONVERTER_CACHE_TIMEOUT', 300),
+                local_size=DMP_OPTIONS.get('CONVERTER_CACHE_LOCAL_SIZE', 1000),
+                local_timeout=DMP_OPTIONS.get('CONVERTER_CACHE_LOCAL_TIMEOUT', 5),
+            )
+
 
 
@@ -1,11 +1,12 @@
 from django.conf import settings
 from django.http import Http404
+from django.core.exceptions import ValidationError, FieldDoesNotExist
 from django.db.models import Model, ObjectDoesNotExist
 
 from .exceptions import RedirectException
 from .util import DMP_OPTIONS, log
 
-import inspect, datetime, decimal, sys
+import inspect, datetime, decimal, re, sys, weakref, copy, typing
 from collections import namedtuple
 from operator import attrgetter
 
@@ -18,12 +19,34 @@ class ConversionTask(object):
     A (mostly) data class that holds meta-information about a conversion
     task.  This object is sent into each converter function.
     '''
+    # attribute name of the model identity map on the request object
+    MODEL_CACHE_KEY = '_dmp_model_cache'
+
     def __init__(self, request, module, function, kwargs):
         self.converter = _check_converter(kwargs.get('converter'))
         self.request = request
         self.module = module
         self.function = function
         self.kwargs = kwargs       # kwargs from the @view_function decorator
+        # batch mode: model parameters are fetched together before conversion (see DefaultConverter.prefetch_models)
+        self.batch_models = kwargs.get('batch_models')
+        if self.batch_models is None:
+            self.batch_models = DMP_OPTIONS.get('BATCH_MODEL_PARAMETERS', False)
+
+
+    @property
+    def model_cache(self):
+        '''
+        The request-scoped identity map of model instances: { (model class, ModelQuery, lookup value): instance or None }.
+        It lives on the request, so internal redirects and repeated parameters reuse
+        instances that were already fetched.  None marks an id that does not exist.
+        '''
+        try:
+            return getattr(self.request, self.MODEL_CACHE_KEY)
+        except AttributeError:
+            cache = {}
+            setattr(self.request, self.MODEL_CACHE_KEY, cache)
+            return cache
 
 
 ##################################################################
@@ -44,6 +67,20 @@ class ConverterInfo(object):
         ConverterInfo.DECLARED_ORDER = 0 if ConverterInfo.DECLARED_ORDER == sys.maxsize else ConverterInfo.DECLARED_ORDER + 1
 
 
+# ISO-8601 parsers for the date/datetime fast path (these were added in Python 3.7)
+DATETIME_FROMISOFORMAT = getattr(datetime.datetime, 'fromisoformat', None)
+DATE_FROMISOFORMAT = getattr(datetime.date, 'fromisoformat', None)
+
+# the input formats that fromisoformat can stand in for, and the exact values it may parse for each
+# (fromisoformat accepts more forms than these, especially in Python 3.11+, so values are checked first)
+ISO_INPUT_FORMATS = { '%Y-%m-%d': r'\d{4}-\d{2}-\d{2}' }
+for _sep in ( ' ', 'T' ):
+    ISO_INPUT_FORMATS['%Y-%m-%d{}%H:%M'.format(_sep)] = r'\d{4}-\d{2}-\d{2}' + _sep + r'\d{2}:\d{2}'
+    ISO_INPUT_FORMATS['%Y-%m-%d{}%H:%M:%S'.format(_sep)] = r'\d{4}-\d{2}-\d{2}' + _sep + r'\d{2}:\d{2}:\d{2}'
+    ISO_INPUT_FORMATS['%Y-%m-%d{}%H:%M:%S.%f'.format(_sep)] = r'\d{4}-\d{2}-\d{2}' + _sep + r'\d{2}:\d{2}:\d{2}\.(?:\d{3}|\d{6})'
+del _sep
+
+
 ##################################################################
 ###   Default converter class
 
@@ -67,6 +104,42 @@ class BaseConverter(object):
         for name, method in inspect.getmembers(self, inspect.ismethod):
             self.converters.extend(getattr(method, ConverterInfo.CONVERT_TYPES_KEY, ()))
         self.converters.sort(key=attrgetter('sort_key'))
+        # type -> bound converter method, filled lazily by get_converter_func()
+        self.dispatch_cache = {}
+
+
+    def add_converter(self, convert_func, *class_types):
+        '''
+        Adds a converter function for the given types after the converter object has been created.
+        The function has the same signature as the @convert_method methods (including self).
+        Subclasses normally use the @convert_method decorator instead of this method.
+        '''
+        for ct in class_types:
+            self.converters.append(ConverterInfo(ct, convert_func))
+        self.converters.sort(key=attrgetter('sort_key'))
+        # the specificity order changed, so the dispatch table must be rebuilt
+        self.dispatch_cache = {}
+
+
+    def get_converter_func(self, convert_type):
+        '''
+        Returns the bound converter method for the given type, or None if no converter matches.
+
+        The first lookup of a type scans the converters, which are sorted by specificity
+        so subclasses match first.  The result is memoized in the dispatch table, so later
+        lookups of the same type are a single dict access.
+        '''
+        try:
+            return self.dispatch_cache[convert_type]
+        except KeyError:
+            pass
+        func = None
+        for ci in self.converters:
+            if issubclass(convert_type, ci.convert_type):
+                func = ci.convert_func.__get__(self, self.__class__)
+                break
+        self.dispatch_cache[convert_type] = func
+        return func
 
 
     def __call__(self, value, parameter, task):
@@ -105,12 +178,10 @@ class BaseConverter(object):
         if isinstance(value, parameter.type):
             return value
 
-        # find the converter method for this type
-        # I'm iterating through the list to find the most specific match first
-        # The list is sorted by specificity so subclasses come first
-        for ci in self.converters:
-            if issubclass(parameter.type, ci.convert_type):
-                return ci.convert_func.__get__(self, self.__class__)(value, parameter, task)
+        # find the converter method for this type (memoized per type in get_converter_func)
+        func = self.get_converter_func(parameter.type)
+        if func is not None:
+            return func(value, parameter, task)
 
         # if we get here, we don't have a converter for this type
         if parameter.type is inspect.Parameter.empty:
@@ -130,6 +201,176 @@ class DefaultConverter(BaseConverter):
     # characters that mean None values in URLs
     EMPTY_CHARACTERS = { '', '-', '0', None }
 
+    # separates the elements of list-typed parameters in a urlparam: /app/compare/12,15,19/
+    LIST_SEPARATOR = ','
+
+    def __init__(self):
+        super().__init__()
+        # ViewParameter -> the input format that last parsed its value (see parse_datetime)
+        # weak keys so parameters of routers that are no longer used (DEBUG mode) drop out
+        self.learned_formats = weakref.WeakKeyDictionary()
+        # input formats (as a tuple) -> the regex of values the fromisoformat fast path may parse
+        self.iso_regexes = {}
+        # type hint -> element type (or None if not a list hint), and list ViewParameter -> element ViewParameter
+        self.list_item_types = {}
+        self.list_item_parameters = weakref.WeakKeyDictionary()
+
+
+    def __call__(self, value, parameter, task):
+        '''
+        Converts list type hints, such as List[int] or List[MyModel], before the
+        regular by-type conversion in BaseConverter.  Parameterized generics can't
+        be used with isinstance(), so they are caught here first.
+        '''
+        item_type = self.get_list_item_type(parameter.type)
+        if item_type is not None:
+            return self.convert_list(value, parameter, item_type, task)
+        return super().__call__(value, parameter, task)
+
+
+    def get_list_item_type(self, type_hint):
+        '''Returns the element type of a list type hint, or None if the hint is not a list (memoized per hint).'''
+        try:
+            return self.list_item_types[type_hint]
+        except KeyError:
+            item_type = self.list_item_types[type_hint] = _get_list_item_type(type_hint)
+            return item_type
+
+
+    def convert_list(self, value, parameter, item_type, task):
+        '''
+        Converts a urlparam like "12,15,19" to a list, converting each element to item_type.
+            - An empty string or dash "-" returns an empty list.
+            - Models are fetched with a single query, in the order given in the url.
+              If any of them doesn't exist, Http404 is raised.
+            - Other types are converted with the regular converter method for the type.
+            - A list default value is copied, so a view that changes it doesn't change it for later requests.
+        '''
+        if isinstance(value, list):  # a default value
+            return list(value)
+        if value is None or value in ( '', '-' ):
+            return []
+        items = value.split(self.LIST_SEPARATOR)
+        if inspect.isclass(item_type) and issubclass(item_type, Model):
+            return self.convert_ids_to_models(items, parameter, item_type, task)
+        # the element parameter is cached so things like learned formats carry across requests
+        try:
+            item_parameter = self.list_item_parameters[parameter]
+        except KeyError:
+            item_parameter = copy.copy(parameter)
+            item_parameter.type = item_type
+            self.list_item_parameters[parameter] = item_parameter
+        func = self.get_converter_func(item_type)
+        if func is None:
+            raise ValueError('No parameter converter exists for type: {}'.format(item_type))
+        return [ func(item, item_parameter, task) for item in items ]
+
+
+    def convert_ids_to_models(self, items, parameter, model, task):
+        '''
+        Fetches the models for a list of urlparam ids with one query, preserving the order of the ids.
+        Like single model parameters, instances in the batch identity map (see prefetch_models)
+        or the cross-request cache aren't queried again.
+        '''
+        query = self.get_model_query(parameter, task)
+        model_cache = self.get_model_cache(model, query)
+        try:
+            lookups = [ query.get_lookup_value(item) for item in items ]
+            found = {}
+            versions = {}
+            for lookup in set(lookups):
+                key = ( model, query, lookup )
+                if task.batch_models and key in task.model_cache:
+                    if task.model_cache[key] is None:
+                        raise KeyError(lookup)
+                    found[lookup] = task.model_cache[key]
+                elif model_cache is not None:
+                    obj = model_cache.get(model, lookup)
+                    if obj is not None:
+                        found[lookup] = obj
+                    else:
+                        versions[lookup] = model_cache.get_version(model, lookup)
+            missing = set(lookups).difference(found)
+            if missing:
+                # urlparams might not be in the field's canonical form (such as an uppercase uuid),
+                # so both sides are compared as the field's python values
+                to_python = query.get_field_normalizer(model)
+                fetched = { to_python(getattr(obj, query.field)): obj for obj in query.get_queryset(model).filter(**{ query.field + '__in': missing }) }
+                for lookup in missing:
+                    obj = fetched.get(to_python(lookup))
+                    if obj is None and query.field != 'id':
+                        # ids compare exactly, but other fields might match in the database by collation
+                        try:
+                            obj = query.get_queryset(model).get(**{ query.field: lookup })
+                        except ObjectDoesNotExist:
+                            pass
+                    if obj is None:
+                        raise KeyError(lookup)
+                    found[lookup] = obj
+                    if model_cache is not None:
+                        model_cache.set(model, lookup, obj, versions[lookup])
+            if task.batch_models:
+                for lookup, obj in found.items():
+                    task.model_cache[( model, query, lookup )] = obj
+            return [ found[lookup] for lookup in lookups ]
+        except (KeyError, ValidationError, ValueError) as e:
+            log.info('Raising Http404 due to parameter conversion error: %s', e)
+            raise Http404('Invalid parameter specified in the url')
+
+
+    def parse_datetime(self, value, parameter, formats, fromisoformat=None):
+        '''
+        Parses a date or datetime string, trying the fastest options first:
+
+            1. The fromisoformat function (Python 3.7+), which parses ISO-8601 without any format matching.
+               It is only used for values in the exact shape of an ISO format in the given formats
+               (see ISO_INPUT_FORMATS), so it never accepts a value the formats would reject.
+            2. The format that last parsed a value for this parameter.
+            3. Each of the given formats, in order.  The one that matches is remembered for the parameter.
+
+        Returns a datetime.datetime (or a datetime.date from a date fromisoformat).
+        Raises ValueError if no format matches.
+        '''
+        if fromisoformat is not None:
+            iso_re = self.get_iso_regex(formats)
+            if iso_re is not None and iso_re.match(value):
+                try:
+                    return fromisoformat(value)
+                except (ValueError, TypeError):
+                    pass
+        last_fmt = self.learned_formats.get(parameter)
+        if last_fmt is not None:
+            try:
+                return datetime.datetime.strptime(value, last_fmt)
+            except (ValueError, TypeError):
+                pass
+        for fmt in formats:
+            if fmt == last_fmt:
+                continue
+            try:
+                dt = datetime.datetime.strptime(value, fmt)
+            except (ValueError, TypeError):
+                continue
+            self.learned_formats[parameter] = fmt
+            return dt
+        raise ValueError("value '{}' does not match any of the input formats in settings.py".format(value))
+
+
+    def get_iso_regex(self, formats):
+        '''
+        Returns a regex that matches the values fromisoformat can parse for the given input
+        formats (see ISO_INPUT_FORMATS), or None if the formats don't include an ISO format.
+        '''
+        formats = tuple(formats)
+        try:
+            return self.iso_regexes[formats]
+        except KeyError:
+            pass
+        patterns = [ ISO_INPUT_FORMATS[fmt] for fmt in formats if fmt in ISO_INPUT_FORMATS ]
+        iso_re = self.iso_regexes[formats] = re.compile(r'(?:{})\Z'.format('|'.join(patterns))) if patterns else None
+        return iso_re
+
+
     @BaseConverter.convert_method(str)
     def convert_str(self, value, parameter, task):
         '''Pass through for strings'''
@@ -176,12 +417,7 @@ class DefaultConverter(BaseConverter):
         if value in self.EMPTY_CHARACTERS:
             return None
         try:
-            for fmt in settings.DATETIME_INPUT_FORMATS:
-                try:
-                    return datetime.datetime.strptime(value, fmt)
-                except (ValueError, TypeError):
-                    continue
-            raise ValueError("value '{}' does not match any formats in settings.DATETIME_INPUT_FORMATS".format(value))
+            return self.parse_datetime(value, parameter, settings.DATETIME_INPUT_FORMATS, DATETIME_FROMISOFORMAT)
         except Exception as e:
             log.info('Raising Http404 due to parameter conversion error: %s', e)
             raise Http404('Invalid parameter specified in the url')
@@ -193,12 +429,8 @@ class DefaultConverter(BaseConverter):
         if value in self.EMPTY_CHARACTERS:
             return None
         try:
-            for fmt in settings.DATE_INPUT_FORMATS:
-                try:
-                    return datetime.datetime.strptime(value, fmt).date()
-                except (ValueError, TypeError):
-                    continue
-            raise ValueError("value '{}' does not match any formats in settings.DATE_INPUT_FORMATS".format(value))
+            dt = self.parse_datetime(value, parameter, settings.DATE_INPUT_FORMATS, DATE_FROMISOFORMAT)
+            return dt.date() if isinstance(dt, datetime.datetime) else dt
         except Exception as e:
             log.info('Raising Http404 due to parameter conversion error: %s', e)
             raise Http404('Invalid parameter specified in the url')
@@ -211,19 +443,213 @@ class DefaultConverter(BaseConverter):
             - The primary key (id) is expected to be an int (standard django way of doing it).
             - An empty string, dash "-", or 0 returns None.
             - Anything else raises Http404, including a DoesNotExist on the .get() call.
+
+        The lookup field and the shape of the query (select_related, only, etc.) can be
+        declared per parameter with a ModelQuery in @view_function(model_queries=...).
         '''
         if value in self.EMPTY_CHARACTERS:
             return None
+        query = self.get_model_query(parameter, task)
         try:
-            pk = int(value)
+            lookup = query.get_lookup_value(value)
         except Exception as e:
             log.info('Raising Http404 due to parameter conversion error: %s', e)
             raise Http404('Invalid parameter specified in the url')
+        # in batch mode, the instance was likely fetched already by prefetch_models()
+        key = ( parameter.type, query, lookup )
+        if task.batch_models and key in task.model_cache:
+            obj = task.model_cache[key]
+            if obj is None:
+                log.info('Raising Http404 due to parameter conversion error: %s matching query does not exist.', parameter.type.__name__)
+                raise Http404('Invalid parameter specified in the url')
+            return obj
+        # the opt-in cross-request cache (see CONVERTER_CACHE_MODELS)
+        model_cache = self.get_model_cache(parameter.type, query)
+        obj = model_cache.get(parameter.type, lookup) if model_cache is not None else None
+        if obj is None:
+            # the version is read before the query so a concurrent save can't be overwritten with the old row
+            version = model_cache.get_version(parameter.type, lookup) if model_cache is not None else None
+            try:
+                obj = query.get_queryset(parameter.type).get(**{ query.field: lookup })
+            except (ObjectDoesNotExist, ValidationError, ValueError) as e:
+                log.info('Raising Http404 due to parameter conversion error: %s', e)
+                raise Http404('Invalid parameter specified in the url')
+            if model_cache is not None:
+                model_cache.set(parameter.type, lookup, obj, version)
+        if task.batch_models:
+            task.model_cache[key] = obj
+        return obj
+
+
+    def get_model_query(self, parameter, task):
+        '''Returns the ModelQuery declared for the given parameter, or the default id-based query.'''
+        return (task.kwargs.get('model_queries') or {}).get(parameter.name, DEFAULT_MODEL_QUERY)
+
+
+    def get_model_cache(self, model, query):
+        '''
+        Returns the cross-request ModelCache if it is enabled for the given model, otherwise None.
+        Only plain id lookups are cached because shaped queries load different data.
+        '''
+        model_cache = DMP_OPTIONS.get('RUNTIME_CONVERTER_CACHE')
+        if model_cache is not None and query == DEFAULT_MODEL_QUERY and model_cache.is_cached_model(model):
+            return model_cache
+        return None
+
+
+    def prefetch_models(self, values, task):
+        '''
+        Called by the router in batch mode before any parameter is converted.
+        The values parameter is a list of ( value, parameter ) tuples.
+
+        Collects the lookup values of all model-typed parameters (including the elements of
+        list-of-model parameters) and fetches them with one query per model class (and ModelQuery).  The instances are placed in the request-scoped
+        identity map (task.model_cache), where convert_id_to_model() finds them.
+        Values that aren't valid lookups are skipped here; they raise Http404 during conversion.
+        '''
+        lookups_by_query = {}
+        versions = {}
+        for value, parameter in values:
+            if not isinstance(value, str):
+                continue
+            model, items = parameter.type, [ value ]
+            item_type = self.get_list_item_type(parameter.type)
+            if item_type is not None:
+                model, items = item_type, value.split(self.LIST_SEPARATOR)
+            if not inspect.isclass(model) or not issubclass(model, Model):
+                continue
+            query = self.get_model_query(parameter, task)
+            model_cache = self.get_model_cache(model, query)
+            for item in items:
+                if item in self.EMPTY_CHARACTERS:
+                    continue
+                try:
+                    lookup = query.get_lookup_value(item)
+                except ValueError:
+                    continue
+                key = ( model, query, lookup )
+                if key in task.model_cache:
+                    continue
+                # instances in the cross-request cache don't need a query
+                obj = model_cache.get(model, lookup) if model_cache is not None else None
+                if obj is not None:
+                    task.model_cache[key] = obj
+                else:
+                    lookups_by_query.setdefault(( model, query ), set()).add(lookup)
+                    if model_cache is not None:
+                        versions[key] = model_cache.get_version(model, lookup)
+        for (model, query), lookups in lookups_by_query.items():
+            try:
+                found = { query.get_lookup_value(str(getattr(obj, query.field))): obj for obj in query.get_queryset(model).filter(**{ query.field + '__in': lookups }) }
+            except (ValidationError, ValueError, AttributeError):
+                continue  # a bad value in the group: let each parameter convert (and fail) on its own
+            model_cache = self.get_model_cache(model, query)
+            for lookup in lookups:
+                obj = found.get(lookup)
+                if obj is not None and model_cache is not None:
+                    model_cache.set(model, lookup, obj, versions[( model, query, lookup )])
+                # ids compare exactly, so a miss is a real miss; other fields (such as uuids) might
+                # be formatted differently in the url, so those misses are left to the regular query
+                if obj is not None or query.field == 'id':
+                    task.model_cache[( model, query, lookup )] = obj
+
+
+
+##################################################################
+###   ModelQuery: declares how a model parameter is queried
+
+class ModelQuery(object):
+    '''
+    A data class that declares how the default converter queries a model-typed
+    view parameter.  Queries are sent per parameter name through @view_function:
+
+        @view_function(model_queries={
+            'product': ModelQuery(field='slug', select_related=( 'store', ), only=( 'name', 'store__name' )),
+        })
+        def process_request(request, product:Product):
+            ...
+
+        field:             The model field the urlparam is matched against.  Defaults to 'id',
+                           which is converted to an int before querying.  Other fields are
+                           sent to the query as strings (Django converts slugs, uuids, etc.).
+        select_related:    Names sent to QuerySet.select_related().
+        prefetch_related:  Names sent to QuerySet.prefetch_related().
+        only:              Names sent to QuerySet.only().  The lookup field is always loaded,
+                           since the fetched objects are matched to the urlparams by it.
+        defer:             Names sent to QuerySet.defer(), except the lookup field.
+    '''
+    def __init__(self, field='id', select_related=(), prefetch_related=(), only=(), defer=()):
+        self.field = field
+        self.select_related = tuple(select_related)
+        self.prefetch_related = tuple(prefetch_related)
+        self.only = tuple(only)
+        self.defer = tuple(defer)
+        # equal queries share batches and identity map entries, so they compare by value
+        self.key = ( self.field, self.select_related, self.prefetch_related, self.only, self.defer )
+
+    def __eq__(self, other):
+        return isinstance(other, ModelQuery) and self.key == other.key
+
+    def __hash__(self):
+        return hash(self.key)
+
+
+    def get_lookup_value(self, value):
+        '''Returns the value to query with.  Raises ValueError if the value can't be used.'''
+        if self.field == 'id':
+            return int(value)
+        return value
+
+
+    def get_field_normalizer(self, model):
+        '''Returns a function that converts values to the python value of the lookup field (or leaves them as they are if it can't)'''
         try:
-            return parameter.type.objects.get(id=pk)
-        except ObjectDoesNotExist as e:
-            log.info('Raising Http404 due to parameter conversion error: %s', e)
-            raise Http404('Invalid parameter specified in the url')
+            field = model._meta.get_field(self.field)
+        except FieldDoesNotExist:
+            return lambda value: value
+        def to_python(value):
+            try:
+                return field.to_python(value)
+            except ValidationError:
+                return value
+        return to_python
+
+
+    def get_queryset(self, model):
+        '''Returns the queryset, shaped by this object, that parameters are fetched from.'''
+        qs = model.objects.all()
+        if self.select_related:
+            qs = qs.select_related(*self.select_related)
+        if self.prefetch_related:
+            qs = qs.prefetch_related(*self.prefetch_related)
+        # a deferred lookup field would cost a query per object when the results are matched to the urlparams
+        if self.only:
+            qs = qs.only(*( self.only + ( self.field, ) ))
+        defer = tuple( name for name in self.defer if name not in ( self.field, 'pk' ) )
+        if defer:
+            qs = qs.defer(*defer)
+        return qs
+
+
+# the query used when a parameter doesn't declare one: objects.get(id=int(value))
+DEFAULT_MODEL_QUERY = ModelQuery()
+
+
+
+def _get_list_item_type(type_hint):
+    '''
+    Returns the element type of a list type hint, or None if the hint is not a list.
+    List[int] returns int, and a bare list or List returns str.
+    '''
+    if type_hint is list:
+        return str
+    origin = getattr(type_hint, '__origin__', None)
+    if origin is list or origin is typing.List:
+        args = getattr(type_hint, '__args__', None)
+        if args and inspect.isclass(args[0]):
+            return args[0]
+        return str
+    return None
 
 
 
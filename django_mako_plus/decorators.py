@@ -120,5 +120,7 @@ class view_function(KeywordArgDecorator):
     '''
     DEFAULT_KWARGS = {
         'converter': None,
+        'batch_models': None,   # None uses the BATCH_MODEL_PARAMETERS option in settings.py
+        'model_queries': None,  # { parameter name: ModelQuery } for model-typed parameters
     }
 
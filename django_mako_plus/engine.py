@@ -8,6 +8,7 @@ from django.utils.module_loading import import_string
 
 from .exceptions import InternalRedirectException, RedirectException
 from .signals import dmp_signal_pre_render_template, dmp_signal_post_render_template, dmp_signal_redirect_exception
+from .static_files import MinifyCache
 from .template import MakoTemplateLoader, MakoTemplateAdapter
 from .registry import register_app, is_dmp_app as registry_is_dmp_app
 from .util import get_dmp_instance, get_dmp_app_configs, log, DMP_OPTIONS, DMP_INSTANCE_KEY
@@ -74,8 +75,9 @@ class MakoTemplates(BaseEngine):
                 from rcssmin import cssmin
             except ImportError:
                 raise ImproperlyConfigured('MINIFY_JS_CSS = True in the Django Mako Plus settings, but the "rcssmin" package does not seem to be loaded.')
-            DMP_OPTIONS['RUNTIME_JSMIN'] = jsmin
-            DMP_OPTIONS['RUNTIME_CSSMIN'] = cssmin
+            # the .cssm/.jsm output is usually the same each time, so the minified text is cached
+            DMP_OPTIONS['RUNTIME_JSMIN'] = MinifyCache(jsmin, DMP_OPTIONS.get('MINIFY_CACHE_SIZE', 500))
+            DMP_OPTIONS['RUNTIME_CSSMIN'] = MinifyCache(cssmin, DMP_OPTIONS.get('MINIFY_CACHE_SIZE', 500))
 
         # should we compile SASS files?
         DMP_OPTIONS['RUNTIME_SCSS_ENABLED'] = False
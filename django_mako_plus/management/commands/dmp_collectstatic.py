@@ -2,9 +2,12 @@ from django.core.management.base import BaseCommand, CommandError
 from django.conf import settings
 
 from django_mako_plus.util import get_dmp_instance, get_dmp_app_configs, DMP_OPTIONS
+from django_mako_plus.static_files import build_templateinfo_chain_by_name, split_chain, get_bundle_sources, get_bundles_dir, write_bundle, write_promoted, content_hash, MANIFEST_NAME
+
+from mako.exceptions import MakoException
 
 from optparse import make_option
-import os, os.path, shutil, fnmatch
+import os, os.path, shutil, fnmatch, json
 from importlib import import_module
 
 
@@ -165,9 +168,23 @@ class Command(BaseCommand):
         self.add_user_rules()
 
         # go through the DMP apps and collect the static files
+        self.dest_root = dest_root
+        self.manifest = { 'files': {}, 'dynamic': [] }
         for config in get_dmp_app_configs():
             self.message('Processing app {}'.format(config.name), 1)
             self.copy_dir(config.path, os.path.abspath(os.path.join(dest_root, config.name)))
+            self.add_dynamic_files(config)
+
+        # write the manifest of content hashes, which the links use instead of modified times
+        self.message('Writing manifest {}'.format(MANIFEST_NAME), 1)
+        self.manifest['dynamic'].sort()
+        with open(os.path.join(dest_root, MANIFEST_NAME), 'w', encoding='utf8') as fout:
+            json.dump(self.manifest, fout, indent=2, sort_keys=True)
+
+        # bundle the css/js files of the template chains, and render the context-free .cssm/.jsm files
+        if DMP_OPTIONS.get('BUNDLE_JS_CSS', False) or DMP_OPTIONS.get('PROMOTE_CSSM_JSM', False):
+            self.message('Writing bundles', 1)
+            self.write_bundles(get_bundles_dir(dest_root))
 
 
     def message(self, msg, level, tab=0):
@@ -195,6 +212,36 @@ class Command(BaseCommand):
             self.rules.append(Rule(pattern, level=None, filetype=TYPE_FILE, score=-100))
 
 
+    def write_bundles(self, bundles_dir):
+        '''Writes the bundles for the templates in the DMP apps.  Pages find these at runtime rather than writing them again.'''
+        promoted = set()
+        for config in get_dmp_app_configs():
+            templates_dir = os.path.join(config.path, 'templates')
+            if not os.path.isdir(templates_dir):
+                continue
+            for fname in sorted(os.listdir(templates_dir)):
+                if fname.startswith('.') or not os.path.isfile(os.path.join(templates_dir, fname)):
+                    continue
+                try:
+                    chain = build_templateinfo_chain_by_name(config, fname, None, force=False)
+                except MakoException as e:
+                    self.message('Skipping template that could not be loaded: {} ({})'.format(fname, e), 2, 1)
+                    continue
+                for kind, minifier in ( ( 'css', cssmin if CSSMIN else None ), ( 'js', jsmin if JSMIN else None ) ):
+                    for item in split_chain(chain, kind):
+                        # a single file is linked directly, so only runs of files are bundled
+                        if isinstance(item, list):
+                            if len(item) > 1 and DMP_OPTIONS.get('BUNDLE_JS_CSS', False):
+                                name = write_bundle(kind, get_bundle_sources(item, kind), bundles_dir, minifier)
+                                self.message('Bundle {} for template {}'.format(name, fname), 2, 1)
+                        # a .cssm/.jsm file that doesn't use the request (the base templates are in many chains, so only once each)
+                        elif DMP_OPTIONS.get('PROMOTE_CSSM_JSM', False) and ( item.app_dir, item.template_name, kind ) not in promoted:
+                            promoted.add(( item.app_dir, item.template_name, kind ))
+                            name = write_promoted(item, kind, bundles_dir, minifier)
+                            if name:
+                                self.message('Rendered {} for {}.{}m'.format(name, item.template_name, kind), 2, 1)
+
+
     def copy_dir(self, source, dest, level=0):
         '''Copies the static files from one directory to another.  If this command is run, we assume the user wants to overwrite any existing files.'''
         encoding = settings.DEFAULT_CHARSET or 'utf8'
@@ -257,6 +304,29 @@ class Command(BaseCommand):
                 self.message('Including file with score {}: {}'.format(score, source_path), msglevel, level+1)
                 shutil.copy2(source_path, dest_path)
 
+            # add the copied file to the manifest with the hash of its (possibly minified) content
+            if os.path.isfile(dest_path):
+                with open(dest_path, 'rb') as fin:
+                    self.manifest['files'][self.get_manifest_path(dest_path)] = content_hash(fin.read())
+
+
+    def add_dynamic_files(self, config):
+        '''
+        Adds the .cssm/.jsm files of an app to the manifest so the runtime doesn't need to check for them.
+        These are listed whether or not the copy rules (such as --skip-dir) included them.
+        '''
+        for subdir in ( 'styles', 'scripts' ):
+            for root, dirs, files in os.walk(os.path.join(config.path, subdir)):
+                for fname in files:
+                    if os.path.splitext(fname)[1].lower() in ( '.cssm', '.jsm' ):
+                        rel = os.path.relpath(os.path.join(root, fname), config.path)
+                        self.manifest['dynamic'].append(self.get_manifest_path(os.path.join(self.dest_root, config.name, rel)))
+
+
+    def get_manifest_path(self, dest_path):
+        '''Returns the manifest key for a file: its path relative to STATIC_ROOT, with forward slashes'''
+        return '/'.join(os.path.relpath(dest_path, self.dest_root).split(os.path.sep))
+
 
 
 ##############################################
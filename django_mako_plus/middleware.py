@@ -1,5 +1,8 @@
+from django.conf import settings
 from django.core.exceptions import ImproperlyConfigured
+from django.utils.functional import SimpleLazyObject
 from django.views.generic import View
+from collections import OrderedDict
 from urllib.parse import unquote
 
 # try to import MiddlewareMixIn (Django 1.10+)
@@ -10,9 +13,9 @@ except ImportError:
     MiddlewareMixin = object
 
 from .router import get_router, route_request, ClassBasedRouter
-from .util import URLParamList, get_dmp_instance, DMP_OPTIONS, log
+from .util import URLParamList, get_dmp_instance, run_sync, DMP_OPTIONS, log
 
-import logging
+import asyncio, logging, threading
 
 ##########################################################
 ###   Middleware the prepares the request for
@@ -21,13 +24,112 @@ import logging
 EMPTY_URLPARAMS = URLParamList()
 DMP_PARAM_CHECK = ( 'dmp_router_app', 'dmp_router_page', 'dmp_router_function', 'urlparams' )
 
+# the cache of routes, keyed by the raw ( app, page, function ) from urls.py, least recently used first
+CACHED_ROUTES = OrderedDict()
+MAX_CACHED_ROUTES = 10000
+rlock = threading.RLock()
+
+
+class Route(object):
+    '''
+    The routing variables for one ( app, page, function ) triple from urls.py:
+    the normalized names, the module path, the fallback template, and the view
+    callable from get_router().  These only depend on the triple, so they're
+    computed once and shared by every request to the same view.
+    '''
+    __slots__ = ( 'app', 'page', 'function', 'module', 'fallback_template', 'callable' )
+
+    def __init__(self, app, page, function):
+        app = app or DMP_OPTIONS.get('DEFAULT_APP', 'homepage')
+        page = page or DMP_OPTIONS.get('DEFAULT_PAGE', 'index')
+        if function:
+            self.fallback_template = '{}.{}.html'.format(page, function)
+        else:
+            self.fallback_template = '{}.html'.format(page)
+            function = 'process_request'
+
+        # period and dash cannot be in python names, but we allow dash in app and page and (dash or period) in the function
+        # these change into underscores
+        self.app = app.replace('-', '_')
+        self.page = page.replace('-', '_')
+        self.function = function.replace('.', '_').replace('-', '_')
+
+        # the full module path
+        self.module = '.'.join([ self.app, 'views', self.page ])
+
+        # the function object - the return of get_router might be a function, a class-based view, or a template
+        # get_router does some magic to make all of these act like a regular view function
+        self.callable = get_router(self.module, self.function, self.app, self.fallback_template)
+
+
+def get_route(app, page, function):
+    '''
+    Gets or creates the Route for the given raw values from urls.py.  Like get_router(),
+    routes are only cached in production mode so view changes are picked up during development.
+    The cache keeps the most recently used routes, so urls with made-up names can't grow
+    it without bound or push out the routes of real pages for good.
+    '''
+    key = ( app, page, function )
+    with rlock:
+        route = CACHED_ROUTES.get(key)
+        if route is not None:
+            CACHED_ROUTES.move_to_end(key)
+            return route
+    route = Route(app, page, function)
+    if not settings.DEBUG:
+        with rlock:
+            CACHED_ROUTES[key] = route
+            while len(CACHED_ROUTES) > MAX_CACHED_ROUTES:
+                CACHED_ROUTES.popitem(last=False)
+    return route
+
+
 class RequestInitMiddleware(MiddlewareMixin):
     '''
     Adds several fields to the request that our controller needs.
     Projects can customize the variables with view middleware that runs after this class.
 
     This class must be included in settings.py -> MIDDLEWARE.
+
+    The class can run in both sync and async (ASGI) middleware chains.  In an async
+    chain (Django 3.1+), process_request() and process_view() for a cached route run
+    directly on the event loop rather than through sync_to_async() in a worker thread.
+    A route that isn't cached yet (or any route in DEBUG mode) can import view modules,
+    so that lookup still goes to a worker thread.  See route_request_async() for async views.
     '''
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None):
+        if MiddlewareMixin is not object:
+            super().__init__(get_response)
+        self.get_response = get_response
+        # Django wraps a sync process_view in sync_to_async() when the chain is async
+        if asyncio.iscoroutinefunction(get_response):
+            self.process_view = self.process_view_async
+
+
+    async def __acall__(self, request):
+        '''
+        The async path of MiddlewareMixin.__call__ (Django 3.1+).  The mixin's version
+        runs process_request() with sync_to_async(); this one calls it directly.
+        '''
+        self.process_request(request)
+        return await self.get_response(request)
+
+
+    async def process_view_async(self, request, view_func, view_args, view_kwargs):
+        '''
+        process_view() as a coroutine, so an async handler awaits it without a thread
+        when the route is cached.  Building a route imports the view module, which
+        shouldn't block the event loop, so uncached routes go to a worker thread.
+        '''
+        key = ( view_kwargs.get('dmp_router_app'), view_kwargs.get('dmp_router_page'), view_kwargs.get('dmp_router_function') )
+        if key in CACHED_ROUTES:
+            return RequestInitMiddleware.process_view(self, request, view_func, view_args, view_kwargs)
+        return await run_sync(RequestInitMiddleware.process_view, self, request, view_func, view_args, view_kwargs)
+
+
     def process_request(self, request):
         '''
         Adds stubs for the DMP custom variables to the request object.
@@ -78,37 +180,25 @@ class RequestInitMiddleware(MiddlewareMixin):
             missing_params = [ param for param in DMP_PARAM_CHECK if param not in view_kwargs ]
             log.debug('variables set by urls.py: %s; variables set by defaults: %s', kwarg_params, missing_params)
 
-        # add the variables to the request
-        request.dmp_router_app = view_kwargs.pop('dmp_router_app', None) or DMP_OPTIONS.get('DEFAULT_APP', 'homepage')
-        request.dmp_router_page = view_kwargs.pop('dmp_router_page', None) or DMP_OPTIONS.get('DEFAULT_PAGE', 'index')
-        request.dmp_router_function = view_kwargs.pop('dmp_router_function', None)
-        if request.dmp_router_function:
-            fallback_template = '{}.{}.html'.format(request.dmp_router_page, request.dmp_router_function)
-        else:
-            fallback_template = '{}.html'.format(request.dmp_router_page)
-            request.dmp_router_function = 'process_request'
-
-        # period and dash cannot be in python names, but we allow dash in app and page and (dash or period) in the function
-        # these change into underscores
-        request.dmp_router_app = request.dmp_router_app.replace('-', '_')
-        request.dmp_router_page = request.dmp_router_page.replace('-', '_')
-        request.dmp_router_function = request.dmp_router_function.replace('.', '_').replace('-', '_')
-
-        # add the full module path to the request
-        request.dmp_router_module = '.'.join([ request.dmp_router_app, 'views', request.dmp_router_page ])
+        # get the routing variables for this app/page/function (computed once per triple)
+        route = get_route(view_kwargs.pop('dmp_router_app', None), view_kwargs.pop('dmp_router_page', None), view_kwargs.pop('dmp_router_function', None))
+        request.dmp_router_app = route.app
+        request.dmp_router_page = route.page
+        request.dmp_router_function = route.function
+        request.dmp_router_module = route.module
+        request._dmp_router_callable = route.callable
 
         # add the url parameters to the request
         # note that I'm not using unquote_plus because the + switches to a space *after* the question mark (in the regular parameters)
         # in the normal url, spaces should be quoted with %20.  Thanks Rosie for the tip.
         kwarg_urlparams = view_kwargs.pop('urlparams', '').strip()
-        if kwarg_urlparams:
-            request.urlparams = URLParamList(( unquote(s) for s in kwarg_urlparams.split('/') ))
-        else:
+        if not kwarg_urlparams:
             request.urlparams = URLParamList()
-
-        # get the function object - the return of get_router_function might be a function, a class-based view, or a template
-        # get_router_function does some magic to make all of these act like a regular view function
-        request._dmp_router_callable = get_router(request.dmp_router_module, request.dmp_router_function, request.dmp_router_app, fallback_template)
+        elif '%' not in kwarg_urlparams:
+            request.urlparams = URLParamList(kwarg_urlparams.split('/'))
+        else:
+            # decoding waits until the view actually uses the parameters
+            request.urlparams = SimpleLazyObject(lambda: URLParamList(( unquote(s) for s in kwarg_urlparams.split('/') )))
 
         # adjust the variable values if a class
         if isinstance(request._dmp_router_callable, ClassBasedRouter):
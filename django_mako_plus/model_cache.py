@@ -0,0 +1,160 @@
+from django.apps import apps
+from django.core.cache import caches
+from django.db.models.signals import post_save, post_delete
+
+from .util import log
+
+from collections import OrderedDict
+import pickle, threading, time, uuid
+
+
+__doc__ = '''
+An opt-in, cross-request cache of the model instances that the default
+converter fetches for view parameters.  It is enabled per model with
+the CONVERTER_CACHE_MODELS option in settings.py.
+'''
+
+
+class ModelCache(object):
+    '''
+    Caches model instances by primary key in Django's cache framework, with a small
+    local LRU in front of it so hot ids don't even make the trip to the cache server.
+    Instances are invalidated automatically on post_save and post_delete, including
+    saves of the parent and child models in multi-table inheritance (they share the row).
+
+    A request can read a row just before another request saves it and then cache
+    the old instance after the save invalidated it.  To prevent this, callers get a
+    version with get_version() *before* they query the database and pass it to set().
+    Each row's version in the shared cache is a random token that invalidate()
+    replaces, and the token is part of the key, so an instance set with an old
+    version is never read.  Local entries are checked against a per-model
+    generation in the same way.
+
+    The signals only reach the current process, so local entries expire after
+    local_timeout seconds.  This bounds how long another process's local LRU can
+    serve an instance that was changed here.  The shared cache is invalidated
+    directly by the signal.
+
+    Local entries are kept pickled (like Django's local-memory cache) so each
+    request gets its own instance.
+    '''
+    def __init__(self, model_labels, cache_alias='default', timeout=300, local_size=1000, local_timeout=5):
+        self.cache = caches[cache_alias] if cache_alias else None
+        self.timeout = timeout
+        self.local = OrderedDict()
+        self.local_size = local_size
+        self.local_timeout = local_timeout
+        self.lock = threading.Lock()
+        # model -> the generation of local entries (incremented when any of its rows is invalidated)
+        self.generations = {}
+        # resolve the models and listen for changes to them and to the models they share rows with
+        self.models = set( apps.get_model(label) for label in model_labels )
+        self.senders = [ model for model in apps.get_models() if self.get_related_models(model) ]
+        for model in self.senders:
+            post_save.connect(self.invalidate, sender=model, weak=False)
+            post_delete.connect(self.invalidate, sender=model, weak=False)
+        log.debug('converter cache enabled for models: %s', ', '.join(model._meta.label for model in self.models))
+
+
+    def disconnect(self):
+        '''Stops listening for model changes (the cache can't be used after this)'''
+        for model in self.senders:
+            post_save.disconnect(self.invalidate, sender=model)
+            post_delete.disconnect(self.invalidate, sender=model)
+        self.models = set()
+        self.senders = []
+
+
+    def is_cached_model(self, model):
+        '''Returns whether instances of the given model class are cached'''
+        return model in self.models
+
+
+    def get_related_models(self, model):
+        '''Returns the cached models that share rows with the given model: itself, its proxies, and its parents and children in multi-table inheritance'''
+        concrete = model._meta.concrete_model
+        lineage = set(concrete._meta.get_parent_list())
+        lineage.add(concrete)
+        return [ cached for cached in self.models if cached._meta.concrete_model in lineage or concrete in cached._meta.concrete_model._meta.get_parent_list() ]
+
+
+    def make_key(self, model, pk):
+        return 'dmp_model_cache:{}:{}'.format(model._meta.label_lower, pk)
+
+
+    def make_version_key(self, model, pk):
+        return 'dmp_model_cache_version:{}:{}'.format(model._meta.label_lower, pk)
+
+
+    def get(self, model, pk):
+        '''Returns the cached instance for the given model and pk, or None if not cached'''
+        key = self.make_key(model, pk)
+        # first the local LRU
+        with self.lock:
+            generation = self.generations.get(model, 0)
+            entry = self.local.get(key)
+            if entry is not None:
+                if entry[0] > time.time():
+                    self.local.move_to_end(key)
+                    return pickle.loads(entry[1])
+                del self.local[key]
+        # then the shared cache, under the row's current version
+        if self.cache is None:
+            return None
+        token = self.cache.get(self.make_version_key(model, pk))
+        if token is None:
+            return None
+        obj = self.cache.get('{}:{}'.format(key, token))
+        if obj is not None:
+            self._set_local(model, key, obj, generation)
+        return obj
+
+
+    def get_version(self, model, pk):
+        '''
+        Returns the current version of the given row.  Call this before querying the
+        database for the instance, and send it to set() with the instance.
+        '''
+        with self.lock:
+            generation = self.generations.get(model, 0)
+        if self.cache is None:
+            return ( generation, None )
+        version_key = self.make_version_key(model, pk)
+        token = self.cache.get(version_key)
+        if token is None:
+            # a new token (rather than a counter) so an evicted version never comes back
+            self.cache.add(version_key, uuid.uuid4().hex, None)
+            token = self.cache.get(version_key)
+        return ( generation, token )
+
+
+    def set(self, model, pk, obj, version):
+        '''Caches the instance for the given model and pk, unless the row was invalidated since get_version() returned version'''
+        key = self.make_key(model, pk)
+        generation, token = version
+        self._set_local(model, key, obj, generation)
+        if self.cache is not None and token is not None:
+            self.cache.set('{}:{}'.format(key, token), obj, self.timeout)
+
+
+    def invalidate(self, sender, instance, **kwargs):
+        '''Signal receiver for post_save and post_delete'''
+        for model in self.get_related_models(sender):
+            key = self.make_key(model, instance.pk)
+            with self.lock:
+                self.generations[model] = self.generations.get(model, 0) + 1
+                self.local.pop(key, None)
+            if self.cache is not None:
+                self.cache.set(self.make_version_key(model, instance.pk), uuid.uuid4().hex, None)
+
+
+    def _set_local(self, model, key, obj, generation):
+        '''Sets a local entry if no row of the model was invalidated since generation was read'''
+        data = pickle.dumps(obj, pickle.HIGHEST_PROTOCOL)
+        with self.lock:
+            if self.generations.get(model, 0) != generation:
+                return
+            self.local[key] = ( time.time() + self.local_timeout, data )
+            self.local.move_to_end(key)
+            while len(self.local) > self.local_size:
+                self.local.popitem(last=False)
@@ -11,19 +11,23 @@ from .decorators import view_function, NotDecoratedError
 from .exceptions import InternalRedirectException, RedirectException
 from .signals import dmp_signal_pre_process_request, dmp_signal_post_process_request, dmp_signal_internal_redirect_exception, dmp_signal_redirect_exception
 from .util import get_dmp_instance, get_dmp_app_configs, log, DMP_OPTIONS
+from .util import is_async_callable, run_sync, run_async
 
-import sys, logging, inspect, threading
+import sys, logging, inspect, threading, asyncio
 from collections import namedtuple
 from importlib import import_module
 from importlib.util import find_spec
 
 
-# lock to keep get_router() thread safe
+# lock to keep get_router() thread safe (it guards ROUTER_LOCKS)
 rlock = threading.RLock()
 
 # the cache of mini-routers
 CACHED_ROUTERS = {}
 
+# one lock per router being built, so slow view imports don't block unrelated views
+ROUTER_LOCKS = {}
+
 
 ##############################################################
 ###   The front controller of all views on the site.
@@ -39,71 +43,141 @@ def route_request(request, *args, **kwargs):
     while True:
         # an outer try that catches the redirect exceptions
         try:
-            # ensure we have a _dmp_router_callable variable on request
-            if getattr(request, '_dmp_router_callable', None) is None:
-                raise ImproperlyConfigured("Variable request._dmp_router_callable does not exist (check MIDDLEWARE for `django_mako_plus.RequestInitMiddleware`).")
-
-            # output the variables so the programmer can debug where this is routing
-            log.info('processing: app=%s, page=%s, module=%s, func=%s, urlparams=%s', request.dmp_router_app, request.dmp_router_page, request.dmp_router_module, request.dmp_router_function, request.urlparams)
+            router = _get_request_router(request)
 
             # if we had a view not found, raise a 404
-            if isinstance(request._dmp_router_callable, ViewDoesNotExist) or isinstance(request._dmp_router_callable, RegistryExceptionRouter):
-                log.info(request._dmp_router_callable.message(request))
-                return request._dmp_router_callable.get_response(request, *args, **kwargs)
+            if isinstance(router, ViewDoesNotExist) or isinstance(router, RegistryExceptionRouter):
+                log.info(router.message(request))
+                return router.get_response(request, *args, **kwargs)
 
             # send the pre-signal
-            if DMP_OPTIONS.get('SIGNALS', False):
-                for receiver, ret_response in dmp_signal_pre_process_request.send(sender=sys.modules[__name__], request=request):
-                    if isinstance(ret_response, (HttpResponse, StreamingHttpResponse)):
-                        return ret_response
+            response = _send_pre_signal(request)
+            if response is not None:
+                return response
 
             # log the view
-            log.info('calling %s', request._dmp_router_callable.message(request))
+            log.info('calling %s', router.message(request))
 
             # call view function with any args and any remaining kwargs
-            response = request._dmp_router_callable.get_response(request, *args, **kwargs)
-
-            # send the post-signal
-            if DMP_OPTIONS.get('SIGNALS', False):
-                for receiver, ret_response in dmp_signal_post_process_request.send(sender=sys.modules[__name__], request=request, response=response):
-                    if ret_response != None:
-                        response = ret_response # sets it to the last non-None in the signal receiver chain
+            response = router.get_response(request, *args, **kwargs)
 
-            # if we didn't get a correct response back, send a 404
-            if not isinstance(response, (HttpResponse, StreamingHttpResponse)):
-                msg = '%s failed to return an HttpResponse (or the post-signal overwrote it).  Returning 500 error.' % request._dmp_router_callable.message(request)
-                log.error(msg)
-                return HttpResponseServerError(msg)
-
-            # return the response
-            return response
+            # send the post-signal and check the response
+            return _finish_response(request, response)
 
         except InternalRedirectException as ivr:
-            # send the signal
-            if DMP_OPTIONS.get('SIGNALS', False):
-                dmp_signal_internal_redirect_exception.send(sender=sys.modules[__name__], request=request, exc=ivr)
-            # resolve to a function
-            request.dmp_router_module = ivr.redirect_module
-            request.dmp_router_function = ivr.redirect_function
-            log.info('received an InternalViewRedirect to %s.%s', request.dmp_router_module, request.dmp_router_function)
-            request._dmp_router_callable = get_router(request.dmp_router_module, request.dmp_router_function, verify_decorator=False)
-            if isinstance(request._dmp_router_callable, RegistryExceptionRouter):
-                log.error('could not fulfill InternalViewRedirect because %s.%s does not exist.', request.dmp_router_module, request.dmp_router_function)
+            _internal_redirect(request, ivr)
             # let it wrap back to the top of the "while True" loop to restart the routing
 
         except RedirectException as e: # redirect to another page
-            if request.dmp_router_class == None:
-                log.info('%s redirected processing to %s', request._dmp_router_callable.message(request), e.redirect_to)
-            # send the signal
-            if DMP_OPTIONS.get('SIGNALS', False):
-                dmp_signal_redirect_exception.send(sender=sys.modules[__name__], request=request, exc=e)
-            # send the browser the redirect command
-            return e.get_response(request)
+            return _redirect(request, e)
 
     # the code should never get here
     raise Exception("Django-Mako-Plus error: The route_request() function should not have been able to get to this point.  Please notify the owner of the DMP project.  Thanks.")
 
 
+async def route_request_async(request, *args, **kwargs):
+    '''
+    The async version of route_request(), for projects served with ASGI.  It awaits
+    `async def` view functions and async converters directly, and moves sync
+    views and converters to a worker thread.  Set ASYNC_ROUTER to True in settings
+    to use it in the default DMP url patterns.
+    '''
+    response = None
+    while True:
+        try:
+            router = _get_request_router(request)
+
+            # if we had a view not found, raise a 404
+            if isinstance(router, ViewDoesNotExist) or isinstance(router, RegistryExceptionRouter):
+                log.info(router.message(request))
+                return await router.get_response_async(request, *args, **kwargs)
+
+            # send the pre-signal
+            response = _send_pre_signal(request)
+            if response is not None:
+                return response
+
+            # log the view
+            log.info('calling %s', router.message(request))
+
+            # call view function with any args and any remaining kwargs
+            response = await router.get_response_async(request, *args, **kwargs)
+
+            # send the post-signal and check the response
+            return _finish_response(request, response)
+
+        except InternalRedirectException as ivr:
+            _internal_redirect(request, ivr)
+
+        except RedirectException as e: # redirect to another page
+            return _redirect(request, e)
+
+    # the code should never get here
+    raise Exception("Django-Mako-Plus error: The route_request_async() function should not have been able to get to this point.  Please notify the owner of the DMP project.  Thanks.")
+
+
+def _get_request_router(request):
+    '''Returns the mini-router the middleware placed on the request'''
+    # ensure we have a _dmp_router_callable variable on request
+    if getattr(request, '_dmp_router_callable', None) is None:
+        raise ImproperlyConfigured("Variable request._dmp_router_callable does not exist (check MIDDLEWARE for `django_mako_plus.RequestInitMiddleware`).")
+
+    # output the variables so the programmer can debug where this is routing
+    log.info('processing: app=%s, page=%s, module=%s, func=%s, urlparams=%s', request.dmp_router_app, request.dmp_router_page, request.dmp_router_module, request.dmp_router_function, request.urlparams)
+    return request._dmp_router_callable
+
+
+def _send_pre_signal(request):
+    '''Sends the pre-signal, returning the response from the first receiver that returns one (or None)'''
+    if DMP_OPTIONS.get('SIGNALS', False):
+        for receiver, ret_response in dmp_signal_pre_process_request.send(sender=sys.modules[__name__], request=request):
+            if isinstance(ret_response, (HttpResponse, StreamingHttpResponse)):
+                return ret_response
+    return None
+
+
+def _finish_response(request, response):
+    '''Sends the post-signal, then checks that we have a response to return'''
+    if DMP_OPTIONS.get('SIGNALS', False):
+        for receiver, ret_response in dmp_signal_post_process_request.send(sender=sys.modules[__name__], request=request, response=response):
+            if ret_response != None:
+                response = ret_response # sets it to the last non-None in the signal receiver chain
+
+    # if we didn't get a correct response back, send a 404
+    if not isinstance(response, (HttpResponse, StreamingHttpResponse)):
+        msg = '%s failed to return an HttpResponse (or the post-signal overwrote it).  Returning 500 error.' % request._dmp_router_callable.message(request)
+        log.error(msg)
+        return HttpResponseServerError(msg)
+
+    # return the response
+    return response
+
+
+def _internal_redirect(request, ivr):
+    '''Points the request at the view function of an InternalRedirectException'''
+    # send the signal
+    if DMP_OPTIONS.get('SIGNALS', False):
+        dmp_signal_internal_redirect_exception.send(sender=sys.modules[__name__], request=request, exc=ivr)
+    # resolve to a function
+    request.dmp_router_module = ivr.redirect_module
+    request.dmp_router_function = ivr.redirect_function
+    log.info('received an InternalViewRedirect to %s.%s', request.dmp_router_module, request.dmp_router_function)
+    request._dmp_router_callable = get_router(request.dmp_router_module, request.dmp_router_function, verify_decorator=False)
+    if isinstance(request._dmp_router_callable, RegistryExceptionRouter):
+        log.error('could not fulfill InternalViewRedirect because %s.%s does not exist.', request.dmp_router_module, request.dmp_router_function)
+
+
+def _redirect(request, e):
+    '''Returns the response for a RedirectException'''
+    if request.dmp_router_class == None:
+        log.info('%s redirected processing to %s', request._dmp_router_callable.message(request), e.redirect_to)
+    # send the signal
+    if DMP_OPTIONS.get('SIGNALS', False):
+        dmp_signal_redirect_exception.send(sender=sys.modules[__name__], request=request, exc=e)
+    # send the browser the redirect command
+    return e.get_response(request)
+
+
 
 ########################################################
 ###   Cache of mini routers
@@ -119,18 +193,26 @@ def get_router(module_name, function_name, fallback_app=None, fallback_template=
     try:
         return CACHED_ROUTERS[key]
     except KeyError:
-        with rlock:
-            # try again now that we're locked
+        pass
+
+    # only one thread builds a given router; the others wait for it and then use the cache
+    with rlock:
+        key_lock = ROUTER_LOCKS.get(key)
+        if key_lock is None:
+            key_lock = ROUTER_LOCKS[key] = threading.RLock()
+    with key_lock:
+        # try again now that we're locked
+        try:
+            return CACHED_ROUTERS[key]
+        except KeyError:
             try:
-                return CACHED_ROUTERS[key]
-            except KeyError:
                 func = router_factory(module_name, function_name, fallback_app, fallback_template, verify_decorator)
                 if not settings.DEBUG:  # only cache in production mode
                     CACHED_ROUTERS[key] = func
                 return func
-
-    # the code should never be able to get here
-    raise Exception("Django-Mako-Plus error: registry.get_router() should not have been able to get to this point.  Please notify the owner of the DMP project.  Thanks.")
+            finally:
+                with rlock:
+                    ROUTER_LOCKS.pop(key, None)
 
 
 def router_factory(module_name, function_name, fallback_app=None, fallback_template=None, verify_decorator=True):
@@ -208,34 +290,91 @@ class ViewFunctionRouter(object):
                 default=p.default,
             ))
         self.parameters = tuple(params)
+        self.is_async = asyncio.iscoroutinefunction(func)
 
 
     def get_response(self, request, *args, **kwargs):
         '''Converts urlparams, calls the view function, returns the response'''
+        ctask, args, pending = self.get_pending(request, args, kwargs)
+        self.convert_pending(ctask, pending)
+        # any async converters return awaitables
+        if any(inspect.isawaitable(container[key]) for container, key, value, parameter in pending):
+            run_async(self.await_pending(pending))
+        # call the view!
+        if self.is_async:
+            return run_async(self.function(request, *args, **kwargs))
+        return self.function(request, *args, **kwargs)
+
+
+    async def get_response_async(self, request, *args, **kwargs):
+        '''
+        The async version of get_response().  Sync converters (which may query the database)
+        run together in one worker thread, and any awaitables they return (async converters)
+        are awaited concurrently.  Async view functions are awaited directly, and sync ones
+        run in a worker thread.
+        '''
+        ctask, args, pending = self.get_pending(request, args, kwargs)
+        if is_async_callable(ctask.converter):
+            self.convert_pending(ctask, pending)
+        else:
+            await run_sync(self.convert_pending, ctask, pending)
+        await self.await_pending(pending)
+        # call the view!
+        if self.is_async:
+            return await self.function(request, *args, **kwargs)
+        return await run_sync(self.function, request, *args, **kwargs)
+
+
+    def get_pending(self, request, args, kwargs):
+        '''
+        Finds the unconverted value for each parameter.  Returns ( ctask, args, pending ),
+        where pending is a list of ( container, key, value, parameter ).  The container
+        is the args list or the kwargs dict that gets the converted value.
+        '''
         ctask = ConversionTask(request, self.module, self.function, self.decorator_kwargs)
         args = list(args)
-        # add urlparams into the arguments and convert the values
+        pending = []
         for i, parameter in enumerate(self.parameters):
             # request, *args, **kwargs?  (skip these)
             if i == 0 or parameter.kind is inspect.Parameter.VAR_POSITIONAL or parameter.kind is inspect.Parameter.VAR_KEYWORD:
                 continue
             # in kwargs already? (kwargs come from any extra named parameters in the urls.py regex match)
             elif parameter.name in kwargs:
-                kwargs[parameter.name] = ctask.converter(kwargs[parameter.name], parameter, ctask)
+                pending.append(( kwargs, parameter.name, kwargs[parameter.name], parameter ))
             # in args already? (this should not be possible because Django doesn't allow mixing of named and positional parameters in the urls.py regex match, but coding for it)
             elif i < len(args):
-                args[i] = ctask.converter(args[i], parameter, ctask)
+                pending.append(( args, i, args[i], parameter ))
             # urlparam value? (<= and -1 because first arg [request] is handled explicitly)
             elif i <= len(request.urlparams) and request.urlparams[i-1] != '':
-                kwargs[parameter.name] = ctask.converter(request.urlparams[i-1], parameter, ctask)
+                pending.append(( kwargs, parameter.name, request.urlparams[i-1], parameter ))
             # default value?
             elif parameter.default is not inspect.Parameter.empty:
-                kwargs[parameter.name] = ctask.converter(parameter.default, parameter, ctask)
+                pending.append(( kwargs, parameter.name, parameter.default, parameter ))
             # fallback is None
             else:
-                kwargs[parameter.name] = ctask.converter(None, parameter, ctask)
-        # call the view!
-        return self.function(request, *args, **kwargs)
+                pending.append(( kwargs, parameter.name, None, parameter ))
+        return ctask, args, pending
+
+
+    def convert_pending(self, ctask, pending):
+        '''Converts the pending values, placing them in their containers'''
+        # in batch mode, give the converter a chance to fetch all the models at once
+        if ctask.batch_models:
+            prefetch_models = getattr(ctask.converter, 'prefetch_models', None)
+            if prefetch_models is not None:
+                prefetch_models([ ( value, parameter ) for container, key, value, parameter in pending ], ctask)
+        # convert the values
+        for container, key, value, parameter in pending:
+            container[key] = ctask.converter(value, parameter, ctask)
+
+
+    async def await_pending(self, pending):
+        '''Awaits any awaitables returned by async converters, all at once'''
+        awaiting = [ ( container, key ) for container, key, value, parameter in pending if inspect.isawaitable(container[key]) ]
+        if awaiting:
+            results = await asyncio.gather(*( container[key] for container, key in awaiting ))
+            for ( container, key ), result in zip(awaiting, results):
+                container[key] = result
 
 
     def message(self, request):
@@ -261,6 +400,13 @@ class ClassBasedRouter(object):
         return HttpResponseNotAllowed([ e.upper() for e in self.endpoints.keys() ])
 
 
+    async def get_response_async(self, request, *args, **kwargs):
+        endpoint = self.endpoints.get(request.method.lower())
+        if endpoint is not None:
+            return await endpoint.get_response_async(request, **kwargs)
+        return self.get_response(request, *args, **kwargs)
+
+
     def message(self, request):
         return 'class-based view function {}.{}.{}'.format(request.dmp_router_module, request.dmp_router_class, request.dmp_router_function)
 
@@ -281,6 +427,10 @@ class TemplateViewRouter(object):
         return template.render_to_response(request=request, context=kwargs)
 
 
+    async def get_response_async(self, request, *args, **kwargs):
+        return await run_sync(self.get_response, request, *args, **kwargs)
+
+
     def message(self, request):
         return 'template {} (view function {}.{} not found)'.format(self.template_name, request.dmp_router_module, request.dmp_router_function)
 
@@ -296,6 +446,10 @@ class RegistryExceptionRouter(object):
         raise Http404(str(self.exc))
 
 
+    async def get_response_async(self, request, *args, **kwargs):
+        return self.get_response(request, *args, **kwargs)
+
+
     def message(self, request):
         return str(self.exc)
 
@@ -1,16 +1,25 @@
 from django.conf import settings
 from django.apps import apps
-from django.template import TemplateDoesNotExist
+from django.core.cache import caches
+from django.http import HttpResponse, HttpResponseNotModified, FileResponse, Http404
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+from django.views.static import was_modified_since
+from django.template import TemplateDoesNotExist, RequestContext
+try:
+    from django.urls import reverse, NoReverseMatch                  # Django 1.10+
+except ImportError:
+    from django.core.urlresolvers import reverse, NoReverseMatch     # Django 1.9
 
 from mako.exceptions import MakoException
-import mako.runtime
+import mako.runtime, mako.lexer, mako.parsetree
 
 from .sass import check_template_scss
 from .exceptions import SassCompileException
-from .util import get_dmp_instance, log, DMP_OPTIONS
+from .util import get_dmp_instance, get_dmp_app_configs, log, DMP_OPTIONS
 
-import os, os.path, io, posixpath, warnings
-from collections import deque
+import os, os.path, io, posixpath, warnings, threading, re, hashlib, tempfile, json, ast, builtins, mimetypes, stat, time
+from collections import deque, OrderedDict
 
 
 
@@ -22,9 +31,26 @@ from collections import deque
 # and encapsulated entirely within this file
 DMP_TEMPLATEINFO_KEY = '_django_mako_plus_templateinfo'
 
-# a cache to store TemplateInfo objects that didn't have an associated template
-# these are normally nonexistent files that were referenced (which we allow)
-NO_TSELF_CACHE = {}
+# a cache of the chains from build_templateinfo_chain_by_name(), by ( app path, template name, cgi_id )
+# it includes the chains for nonexistent files that were referenced (which we allow), so it is bounded
+NAMED_CHAINS = OrderedDict()
+MAX_NAMED_CHAINS = 1000
+named_chains_lock = threading.Lock()
+
+# key to keep the chains built during a request (shared by link_css and link_js)
+REQUEST_CHAINS_KEY = '_django_mako_plus_templateinfo_chains'
+
+# key to keep the Link header values of the links rendered during a request (see get_preload_header)
+REQUEST_PRELOAD_KEY = '_django_mako_plus_preload'
+
+# key to attach the precomputed link html to the (leaf) Mako Template
+DMP_LINKS_KEY = '_django_mako_plus_links'
+
+# key to attach the uris of the templates that a template includes (or imports as namespaces) to the Mako Template
+DMP_COMPONENTS_KEY = '_django_mako_plus_components'
+
+# the values of the loading parameter of link_js()
+SCRIPT_LOADING = ( None, 'defer', 'async' )
 
 
 #######################################################################
@@ -66,15 +92,13 @@ def link_css(tself, cgi_id=None):
     files even if their cached versions have't expired yet.
     By adding an arbitrary id to the end of the .css and .js files, browsers will
     see the files as *new* anytime that id changes.  The default method
-    for calculating the id is the file modification time (minutes since 1970).
+    for calculating the id is the content hash in the manifest written by
+    dmp_collectstatic, or the file modification time when there isn't a manifest.
     '''
-    html = []
-    for ti in reversed(build_templateinfo_chain(tself, cgi_id)):
-        ti.append_css(tself.context.get('request'), tself.context, html)
-    return '\n'.join(html)
+    return render_links(tself, cgi_id, 'css')
 
 
-def link_js(tself, cgi_id=None):
+def link_js(tself, cgi_id=None, loading=None):
     '''
     Renders the <script> links for a given template:
 
@@ -108,12 +132,15 @@ def link_js(tself, cgi_id=None):
     files even if their cached versions have't expired yet.
     By adding an arbitrary id to the end of the .css and .js files, browsers will
     see the files as *new* anytime that id changes.  The default method
-    for calculating the id is the file modification time (minutes since 1970).
+    for calculating the id is the content hash in the manifest written by
+    dmp_collectstatic, or the file modification time when there isn't a manifest.
+
+    The optional loading parameter adds a 'defer' or 'async' attribute to the
+    <script src> tags so they don't block the page from rendering.  It defaults
+    to the JS_LOADING option.  The rendered .jsm scripts run right away, so they
+    shouldn't depend on deferred scripts.
     '''
-    html = []
-    for ti in reversed(build_templateinfo_chain(tself, cgi_id)):
-        ti.append_js(tself.context.get('request'), tself.context, html)
-    return '\n'.join(html)
+    return render_links(tself, cgi_id, 'js', _get_script_loading(loading))
 
 
 def link_template_css(request, app, template_name, context, cgi_id=None, force=True):
@@ -129,14 +156,17 @@ def link_template_css(request, app, template_name, context, cgi_id=None, force=T
     The related .css/.cssm files are created for the template_name
     even if a nonexistent filename is sent.  This can be useful when
     creating html directly within Python code.
+
+    The links are rendered like link_css(), so the bundling, promotion, and
+    preload options apply.  Since the view creates its own response, it adds
+    the Link header with get_preload_header(request) when it wants one.
     '''
-    html = []
-    for ti in reversed(build_templateinfo_chain_by_name(app, template_name, cgi_id, force)):
-        ti.append_css(request, context, html)
-    return '\n'.join(html)
+    chain = build_templateinfo_chain_by_name(app, template_name, cgi_id, force)
+    parts = get_chain_link_parts(chain[0].links, chain, cgi_id, 'css', None, request)
+    return render_link_parts(parts, 'css', request, context)
 
 
-def link_template_js(request, app, template_name, context, cgi_id=None, force=True):
+def link_template_js(request, app, template_name, context, cgi_id=None, force=True, loading=None):
     '''
     Renders the scripts for the given template in the given app.  Normally,
     link_js() is used to accomplish this in your base template.  This method
@@ -149,11 +179,23 @@ def link_template_js(request, app, template_name, context, cgi_id=None, force=Tr
     The related .js/.jsm files are created for the template_name
     even if a nonexistent filename is sent.  This can be useful when
     creating html directly within Python code.
+
+    The loading parameter is the same as in link_js().  As in link_template_css(),
+    the bundling, promotion, and preload options apply.
     '''
-    html = []
-    for ti in reversed(build_templateinfo_chain_by_name(app, template_name, cgi_id, force)):
-        ti.append_js(request, context, html)
-    return '\n'.join(html)
+    loading = _get_script_loading(loading)
+    chain = build_templateinfo_chain_by_name(app, template_name, cgi_id, force)
+    parts = get_chain_link_parts(chain[0].links, chain, cgi_id, 'js', loading, request)
+    return render_link_parts(parts, 'js', request, context)
+
+
+def _get_script_loading(loading):
+    '''Returns the loading for link_js() and link_template_js(), which defaults to the JS_LOADING option'''
+    if loading is None:
+        loading = DMP_OPTIONS.get('JS_LOADING')
+    if loading not in SCRIPT_LOADING:
+        raise ValueError('The script loading must be one of {}: {}'.format(SCRIPT_LOADING, loading))
+    return loading
 
 
 
@@ -172,6 +214,445 @@ def get_template_js(tself, request, context, cgi_id=None):
 
 
 
+##############################################################################
+###   Renders the links for a chain.  The <link> and <script src> tags
+###   never change for a chain, so they are joined once and cached on
+###   the template.  Only the .cssm/.jsm files are rendered per request.
+
+def render_links(tself, cgi_id, kind, loading=None):
+    '''
+    Renders the css or js links (kind is 'css' or 'js') for the template
+    inheritance chain of tself.  This function is not normally used directly.
+    Use the link_css() and link_js() functions instead.
+    '''
+    parts = get_link_parts(tself, cgi_id, kind, loading)
+    return render_link_parts(parts, kind, tself.context.get('request'), tself.context)
+
+
+def render_link_parts(parts, kind, request, context):
+    '''Renders the parts from get_link_parts() or get_chain_link_parts() for a request'''
+    # the common case: no .cssm/.jsm files in the chain
+    if len(parts) == 1 and isinstance(parts[0], str):
+        return parts[0]
+    html = []
+    for part in parts:
+        if isinstance(part, str):
+            html.append(part)
+        elif kind == 'css':
+            part.append_cssm(request, context, html)
+        else:
+            part.append_jsm(request, context, html)
+    return '\n'.join(html)
+
+
+def get_link_parts(tself, cgi_id, kind, loading=None):
+    '''
+    Returns the link parts for the chain of tself: a tuple of strings (the static
+    tags, already joined) and TemplateInfo objects (levels with a .cssm/.jsm file to
+    render).  The parts are cached on the leaf template along with the chain they
+    came from, so a chain that is rebuilt (DEBUG mode) or that inherits from a
+    different template this time gets new parts.  The Link header value that
+    preloads the files is cached with them, and it is recorded on the request
+    when the parts are used (see get_preload_header).
+    '''
+    chain = get_request_templateinfo_chain(tself, cgi_id)
+    links = getattr(tself.template, DMP_LINKS_KEY, None)
+    if links is None:
+        links = {}
+        setattr(tself.template, DMP_LINKS_KEY, links)
+    return get_chain_link_parts(links, chain, cgi_id, kind, loading, tself.context.get('request'))
+
+
+def get_chain_link_parts(links, chain, cgi_id, kind, loading, request):
+    '''
+    Returns the link parts for a chain (see get_link_parts), caching them in
+    the links dict, and records their preload value on the request.
+    '''
+    key = ( kind, cgi_id, loading )
+    entry = links.get(key)
+    if entry is None or len(entry[0]) != len(chain) or any(a is not b for a, b in zip(entry[0], chain)):
+        entry = links[key] = ( tuple(chain), _build_link_parts(chain, kind, loading), _build_preload(chain, kind) )
+    if request is not None and entry[2]:
+        preload = getattr(request, REQUEST_PRELOAD_KEY, None)
+        if preload is None:
+            preload = []
+            setattr(request, REQUEST_PRELOAD_KEY, preload)
+        if entry[2] not in preload:
+            preload.append(entry[2])
+    return entry[1]
+
+
+def _build_link_parts(chain, kind, loading=None):
+    '''Builds the parts for get_link_parts(), with the supertemplate first'''
+    parts = []
+    for item in split_chain(chain, kind):
+        if isinstance(item, list):
+            html = _get_static_links(item, kind, loading)
+        else:
+            # a .cssm/.jsm file that doesn't use the request is linked like a static file
+            href = item.get_promoted_href(kind)
+            if href is None:
+                parts.append(item)
+                continue
+            if not href:
+                continue
+            html = BUNDLE_TAGS[kind] % href if kind == 'css' else _script_tag(href, loading)
+        if parts and isinstance(parts[-1], str):
+            parts[-1] += '\n' + html
+        else:
+            parts.append(html)
+    if not parts:
+        parts.append('')
+    return tuple(parts)
+
+
+def _build_preload(chain, kind):
+    '''Builds the Link header value that preloads the linked (not inlined) files of a chain'''
+    return ', '.join( '<%s>; rel=preload; as=%s' % ( href, 'style' if kind == 'css' else 'script' ) for href in get_static_hrefs(chain, kind) )
+
+
+def get_preload_header(request):
+    '''
+    Returns the value of a Link header that preloads the .css/.js files that
+    link_css() and link_js() linked during this request, or None if they didn't
+    link any.  This is called after the template renders, so only the links
+    this response actually has are preloaded.  Browsers can then fetch the files
+    in parallel with the html rather than waiting to find them in the <head>.
+    '''
+    preload = getattr(request, REQUEST_PRELOAD_KEY, None)
+    if not preload:
+        return None
+    return ', '.join(preload)
+
+
+def split_chain(chain, kind):
+    '''
+    Splits a chain into the order its links are rendered, supertemplate first:
+    lists of the consecutive levels with a static .css/.js file, and the TemplateInfo
+    objects of levels with a .cssm/.jsm file to render.  Each list is linked
+    with one tag per file, or with one tag when bundling is on.
+    '''
+    items = []
+    static = []
+    for ti in reversed(chain):
+        tag, dynamic = ( ti.css, ti.cssm ) if kind == 'css' else ( ti.js, ti.jsm )
+        if tag:
+            static.append(ti)
+        if dynamic:
+            if static:
+                items.append(static)
+                static = []
+            items.append(ti)
+    if static:
+        items.append(static)
+    return items
+
+
+def _get_static_links(tis, kind, loading=None):
+    '''Returns the html for consecutive levels with static .css/.js files: a bundle tag when bundling is on, or one tag per file.'''
+    url = _get_run_bundle_url(tis, kind)
+    if url is not None:
+        return BUNDLE_TAGS[kind] % url if kind == 'css' else _script_tag(url, loading)
+    if kind == 'css':
+        return '\n'.join( ti.css for ti in tis )
+    return '\n'.join( _script_tag(ti.js_href, loading) if ti.js_href and loading else ti.js for ti in tis )
+
+
+def get_static_hrefs(chain, kind):
+    '''Returns the urls of the .css/.js files (or bundles) that are linked for a chain, supertemplate first'''
+    hrefs = []
+    for item in split_chain(chain, kind):
+        if isinstance(item, list):
+            url = _get_run_bundle_url(item, kind)
+            if url is not None:
+                hrefs.append(url)
+            else:
+                hrefs.extend( href for href in ( ti.css_href if kind == 'css' else ti.js_href for ti in item ) if href )
+        else:
+            href = item.get_promoted_href(kind)
+            if href:
+                hrefs.append(href)
+    return hrefs
+
+
+def _get_run_bundle_url(tis, kind):
+    '''Returns the bundle url for consecutive levels with static .css/.js files, or None if they aren't bundled'''
+    if len(tis) > 1 and DMP_OPTIONS.get('BUNDLE_JS_CSS', False) and not settings.DEBUG:
+        return get_bundle_url(kind, get_bundle_sources(tis, kind))
+    return None
+
+
+def _script_tag(href, loading=None):
+    '''Returns a <script src> tag, with the defer or async attribute if loading is set'''
+    if loading:
+        return '<script %s src="%s"></script>' % ( loading, href )
+    return '<script src="%s"></script>' % href
+
+
+
+
+##############################################################################
+###   Bundles: the static .css/.js files of consecutive levels in a chain,
+###   concatenated (and minified) into one file named by its content hash.
+###   The bundles are written by dmp_collectstatic, and lazily at runtime
+###   for any chain that doesn't have one yet.
+
+# the directory within STATIC_ROOT (and STATIC_URL) for the bundles
+BUNDLES_DIR = 'dmp-bundles'
+
+# the bundle urls, by kind and source files, so identical chains share a bundle
+BUNDLE_URLS = {}
+
+# the tag that links a css bundle (js bundles use _script_tag)
+BUNDLE_TAGS = {
+    'css': '<link rel="stylesheet" type="text/css" href="%s" />',
+}
+
+# the relative urls in css files need to be rewritten because the bundle is in another directory
+RE_CSS_URL = re.compile(r'''(url\(\s*(['"]?)|@import\s+(['"]))([^'")\s]+)''')
+RE_URL_SCHEME = re.compile(r'^[a-zA-Z][a-zA-Z0-9+.\-]*:')
+
+# inlined text can't contain these
+RE_CLOSING_TAG = re.compile(r'</(style|script)', re.IGNORECASE)
+
+
+def get_bundle_sources(tis, kind):
+    '''
+    Returns the source files of a bundle for the given TemplateInfo objects
+    (supertemplate first) as ( filename, static url ) pairs.
+    '''
+    if kind == 'css':
+        return tuple( ( ti.css_file, posixpath.join(settings.STATIC_URL, ti.app_url, 'styles', ti.template_name + '.css') ) for ti in tis )
+    return tuple( ( ti.js_file, posixpath.join(settings.STATIC_URL, ti.app_url, 'scripts', ti.template_name + '.js') ) for ti in tis )
+
+
+def get_bundle_url(kind, sources):
+    '''
+    Returns the static url of the bundle for the given sources, writing the
+    bundle to STATIC_ROOT if needed.  Returns None if the bundle can't be
+    written (such as when STATIC_ROOT isn't set), so the files are linked
+    separately instead.
+    '''
+    key = ( kind, sources )
+    url = BUNDLE_URLS.get(key)
+    if url is None:
+        if not getattr(settings, 'STATIC_ROOT', None):
+            return None
+        minifier = DMP_OPTIONS.get('RUNTIME_CSSMIN' if kind == 'css' else 'RUNTIME_JSMIN')
+        try:
+            # minify directly rather than through the MinifyCache because each bundle is only made once
+            name = write_bundle(kind, sources, get_bundles_dir(), getattr(minifier, 'minify', minifier) or None)
+        except OSError as e:
+            log.warning('could not write a %s bundle, so the files are linked separately: %s', kind, e)
+            return None
+        url = BUNDLE_URLS[key] = posixpath.join(settings.STATIC_URL, BUNDLES_DIR, name)
+    return url
+
+
+def get_bundles_dir(static_root=None):
+    '''Returns the directory of the bundles, within static_root (the settings.py STATIC_ROOT by default)'''
+    return os.path.join(os.path.abspath(settings.BASE_DIR), static_root or settings.STATIC_ROOT, BUNDLES_DIR)
+
+
+def write_bundle(kind, sources, bundles_dir, minifier=None):
+    '''
+    Concatenates the source files into a bundle in bundles_dir, and returns its
+    filename: the content hash with a .css or .js extension.  The sources are
+    ( filename, static url ) pairs.  If the bundle already exists, it isn't
+    written again.
+    '''
+    encoding = settings.DEFAULT_CHARSET or 'utf8'
+    texts = []
+    for filename, url in sources:
+        with open(filename, encoding=encoding) as fin:
+            text = fin.read()
+        if kind == 'css':
+            text = _absolute_css_urls(text, posixpath.dirname(url))
+        if minifier is not None:
+            text = minifier(text)
+        texts.append(text)
+    # the separator keeps a script without a final semicolon from running into the next one
+    content = ( '\n' if kind == 'css' else '\n;\n' ).join(texts).encode(encoding)
+    return write_hashed_file(kind, content, bundles_dir)
+
+
+def write_hashed_file(kind, content, bundles_dir):
+    '''
+    Writes the content (bytes) to bundles_dir, named by its hash with a .css or .js
+    extension, and returns the filename.  If the file already exists, it isn't
+    written again.
+    '''
+    name = '%s.%s' % ( content_hash(content), kind )
+    path = os.path.join(bundles_dir, name)
+    if not os.path.exists(path):
+        os.makedirs(bundles_dir, exist_ok=True)
+        # write to a temp file and rename so other threads/processes never see a partial bundle
+        fd, temp = tempfile.mkstemp(dir=bundles_dir, prefix='.' + name)
+        try:
+            with os.fdopen(fd, 'wb') as fout:
+                fout.write(content)
+            os.chmod(temp, 0o644)
+            os.replace(temp, path)
+        except:
+            os.unlink(temp)
+            raise
+    return name
+
+
+def _absolute_css_urls(text, base_url):
+    '''Rewrites the relative url() and @import references in css text to be absolute, relative to base_url'''
+    def repl(match):
+        url = match.group(4)
+        if url.startswith(( '/', '#' )) or RE_URL_SCHEME.match(url):
+            return match.group(0)
+        return match.group(1) + posixpath.normpath(posixpath.join(base_url, url))
+    return RE_CSS_URL.sub(repl, text)
+
+
+
+
+##############################################################################
+###   Promoted .cssm/.jsm files.  Many of these files don't use anything
+###   from the request, such as those that only use ${ settings.X }.
+###   These are rendered once, written next to the bundles, and linked
+###   like static files rather than being rendered into every page.
+
+# names that are the same for every render: Mako's own and what DMP adds when there isn't a request
+CONTEXT_FREE_NAMES = frozenset(( 'settings', 'STATIC_URL', 'UNDEFINED', 'capture', 'caller', 'loop' ))
+
+# tags that bring in other templates, which might use the request context
+CONTEXT_TAGS = ( mako.parsetree.IncludeTag, mako.parsetree.NamespaceTag, mako.parsetree.InheritTag, mako.parsetree.CallNamespaceTag )
+
+# key to attach the result of is_context_free() to the Mako Template
+DMP_CONTEXT_FREE_KEY = '_django_mako_plus_context_free'
+
+
+def is_promote_enabled():
+    '''Returns whether context-free .cssm/.jsm files are promoted to static files (the PROMOTE_CSSM_JSM option, when DEBUG is False)'''
+    return DMP_OPTIONS.get('PROMOTE_CSSM_JSM', False) and not settings.DEBUG and bool(getattr(settings, 'STATIC_ROOT', None))
+
+
+def is_context_free(template):
+    '''
+    Returns whether the Mako template renders the same for every request.  The parse
+    tree is checked, one Mako scope at a time, for identifiers that aren't declared in
+    their scope, imported by DEFAULT_TEMPLATE_IMPORTS, builtins, or in CONTEXT_FREE_NAMES.
+    Templates with <%include>, <%namespace>, or <%inherit>, and templates whose <%page>
+    or <%block> declares args (which come from the context), are never context free.
+    The result is cached on the template, so a reloaded template is checked again.
+    '''
+    free = getattr(template, DMP_CONTEXT_FREE_KEY, None)
+    if free is None:
+        free = _check_context_free(template.source)
+        setattr(template, DMP_CONTEXT_FREE_KEY, free)
+    return free
+
+
+def _check_context_free(source):
+    '''Checks the template source for is_context_free()'''
+    try:
+        root = mako.lexer.Lexer(source).parse()
+    except MakoException:
+        return False
+    # the names visible in every scope: the <%! %> module blocks and the <%def> functions
+    global_names = set(CONTEXT_FREE_NAMES)
+    global_names.update(_get_import_names())
+    global_names.update(dir(builtins))
+    nodes = [ root ]
+    while nodes:
+        node = nodes.pop()
+        if isinstance(node, CONTEXT_TAGS):
+            return False
+        if isinstance(node, ( mako.parsetree.PageTag, mako.parsetree.BlockTag )) and node.declared_identifiers():
+            return False
+        if isinstance(node, mako.parsetree.Code) and node.ismodule:
+            global_names.update(node.declared_identifiers())
+        elif isinstance(node, mako.parsetree.DefTag):
+            global_names.add(node.funcname)
+        nodes.extend(node.get_children())
+    return _is_scope_context_free(root.get_children(), global_names, global_names)
+
+
+def _is_scope_context_free(children, declared, global_names):
+    '''
+    Checks the nodes of one Mako scope for _check_context_free().  declared is the names
+    visible from outside the scope.  A <%def> or <%block> starts a new scope that only
+    sees the global names and its own; a <%call> body is a closure that also sees this scope.
+    '''
+    declared = set(declared)
+    undeclared = set()
+    inner = []
+    nodes = list(children)
+    while nodes:
+        node = nodes.pop()
+        if hasattr(node, 'undeclared_identifiers'):
+            undeclared.update(node.undeclared_identifiers())
+        if isinstance(node, ( mako.parsetree.DefTag, mako.parsetree.BlockTag )):
+            inner.append(( node, False ))
+        elif isinstance(node, mako.parsetree.CallTag):
+            inner.append(( node, True ))
+        else:
+            if hasattr(node, 'declared_identifiers'):
+                declared.update(node.declared_identifiers())
+            nodes.extend(node.get_children())
+    if undeclared - declared:
+        return False
+    for node, closure in inner:
+        names = set(declared if closure else global_names)
+        names.update(node.declared_identifiers())
+        if not _is_scope_context_free(node.get_children(), names, global_names):
+            return False
+    return True
+
+
+def _get_import_names():
+    '''Returns the names defined by the DEFAULT_TEMPLATE_IMPORTS, which are part of every compiled template'''
+    names = set()
+    for line in DMP_OPTIONS.get('DEFAULT_TEMPLATE_IMPORTS') or ():
+        try:
+            tree = ast.parse(line)
+        except SyntaxError:
+            continue
+        for node in ast.walk(tree):
+            if isinstance(node, ( ast.Import, ast.ImportFrom )):
+                names.update( alias.asname or alias.name.split('.')[0] for alias in node.names )
+    return names
+
+
+def render_promoted(ti, kind, minifier=None):
+    '''
+    Renders the .cssm/.jsm file of a TemplateInfo without a request, if it is
+    context free.  Returns the (minified) text, or None if the file depends on the
+    request context and needs to be rendered into each page.
+    '''
+    subdir, fname = ( 'styles', ti.cssm ) if kind == 'css' else ( 'scripts', ti.jsm )
+    template = get_dmp_instance().get_template_loader_for_path(os.path.join(ti.app_dir, subdir)).get_template(fname)
+    if not is_context_free(template.mako_template):
+        return None
+    text = template.render(request=None, context=None)
+    if kind == 'css':
+        text = _absolute_css_urls(text, posixpath.join(settings.STATIC_URL, ti.app_url, 'styles'))
+    if minifier is not None:
+        text = minifier(text)
+    return text
+
+
+def write_promoted(ti, kind, bundles_dir, minifier=None):
+    '''
+    Renders and writes a context-free .cssm/.jsm file to bundles_dir.  Returns the filename,
+    None if it isn't context free, or an empty string if it rendered nothing (so there's
+    nothing to link).
+    '''
+    text = render_promoted(ti, kind, minifier)
+    if text is None:
+        return None
+    if not text.strip():
+        return ''
+    return write_hashed_file(kind, text.encode(settings.DEFAULT_CHARSET or 'utf8'), bundles_dir)
+
+
+
+
 ##############################################################################
 ###   Builds a chain of TemplateInfo objects, one of each level
 ###   of the inheritance chain of a template.
@@ -199,27 +680,113 @@ def build_templateinfo_chain(tself, cgi_id=None):
     '''
     # making a list (instead of generator) because it gets reversed() in functions like link_css()
     chain = []
+    components = DMP_OPTIONS.get('LINK_COMPONENTS', False)
 
     # step through the template inheritance
     while tself is not None:
-        # first check the cache, creating if necessary
-        ti = getattr(tself.template, DMP_TEMPLATEINFO_KEY, None)
-        if ti is None:
-            template_dir, template_name = os.path.split(tself.template.filename)
-            app_dir = os.path.dirname(template_dir)
-            ti = TemplateInfo(app_dir, template_name, cgi_id)
-            # cache in template if in production mode
-            if not settings.DEBUG:
-                setattr(tself.template, DMP_TEMPLATEINFO_KEY, ti)
         # append the TemplateInfo
-        chain.append(ti)
+        chain.append(get_templateinfo(tself.template, cgi_id))
+        # the components this level includes, which load just before it (the chain is reversed later)
+        if components:
+            for component in reversed(get_component_templates(tself.template)):
+                ti = get_templateinfo(component, cgi_id)
+                if ti.css or ti.cssm or ti.js or ti.jsm:
+                    chain.append(ti)
         # loop with the next inherited template
         tself = tself.inherits
 
+    # a component used in several places only loads the first time
+    if components:
+        chain = _dedupe_chain(chain)
+
     # return
     return chain
 
 
+def get_templateinfo(template, cgi_id=None):
+    '''Returns the TemplateInfo of a Mako template, which is cached on the template by cgi_id'''
+    # the cgi_id is in the urls, so each one gets its own TemplateInfo
+    cache = getattr(template, DMP_TEMPLATEINFO_KEY, None)
+    if cache is None:
+        cache = {}
+        setattr(template, DMP_TEMPLATEINFO_KEY, cache)
+    # first check the cache, creating if necessary (in DEBUG mode, also if the files changed)
+    ti = cache.get(cgi_id)
+    if ti is None or (settings.DEBUG and not ti.is_current()):
+        template_dir, template_name = os.path.split(template.filename)
+        app_dir = os.path.dirname(template_dir)
+        ti = cache[cgi_id] = TemplateInfo(app_dir, template_name, cgi_id)
+    return ti
+
+
+def get_component_templates(template):
+    '''
+    Returns the Mako templates that a template pulls in with <%include file="..."/> and
+    <%namespace file="..."/> (see the LINK_COMPONENTS option).  The components of those
+    templates are included too.  They are in the order their CSS/JS loads: each
+    component's own components come before it.  Files given by an expression, such as
+    file="${ name }", can't be known ahead of time, so they are skipped.
+    '''
+    found = []
+    _add_component_templates(template, found, { template.filename })
+    return found
+
+
+def _add_component_templates(template, found, seen):
+    '''Adds the components of template to found, depth first (see get_component_templates)'''
+    for uri in _get_component_uris(template):
+        try:
+            component = template.lookup.get_template(uri)
+        except MakoException:  # a missing or broken component is reported when the template renders
+            continue
+        if component.filename in seen:
+            continue
+        seen.add(component.filename)
+        _add_component_templates(component, found, seen)
+        found.append(component)
+
+
+def _get_component_uris(template):
+    '''
+    Returns the uris of the templates that a template includes or imports as a namespace,
+    in the order they are in the file.  The template is parsed once, and the uris are
+    cached on it.
+    '''
+    uris = getattr(template, DMP_COMPONENTS_KEY, None)
+    if uris is None:
+        uris = []
+        if template.lookup is not None and template.filename is not None:
+            try:
+                nodes = [ mako.lexer.Lexer(template.source).parse() ]
+            except MakoException:
+                nodes = []
+            while nodes:
+                node = nodes.pop()
+                if isinstance(node, ( mako.parsetree.IncludeTag, mako.parsetree.NamespaceTag )):
+                    filename = node.attributes.get('file')
+                    if filename and '${' not in filename:
+                        uri = template.lookup.adjust_uri(filename, template.uri)
+                        if uri not in uris:
+                            uris.append(uri)
+                # in reverse so they pop off in order
+                nodes.extend(reversed(node.get_children()))
+        setattr(template, DMP_COMPONENTS_KEY, uris)
+    return uris
+
+
+def _dedupe_chain(chain):
+    '''Removes the repeated TemplateInfo objects (by file) from a chain, keeping the one closest to the supertemplate end'''
+    seen = set()
+    deduped = []
+    for ti in reversed(chain):
+        key = ( ti.app_dir, ti.template_name )
+        if key not in seen:
+            seen.add(key)
+            deduped.append(ti)
+    deduped.reverse()
+    return deduped
+
+
 def build_templateinfo_chain_by_name(app, template_name, cgi_id, force=True):
     '''
     Retrieves a chain of TemplateInfo objects.  The chain is formed by following
@@ -252,26 +819,82 @@ def build_templateinfo_chain_by_name(app, template_name, cgi_id, force=True):
     if isinstance(app, str):
         app = apps.get_app_config(app)
 
+    # check the cache first: the Mako context below is only needed when the chain is new or a template reloaded
+    key = ( app.path, template_name, cgi_id )
+    with named_chains_lock:
+        entry = NAMED_CHAINS.get(key)
+        if entry is not None:
+            NAMED_CHAINS.move_to_end(key)
+    if entry is not None and _is_named_chain_current(entry, force):
+        return entry[1]
+
     # try to generate a tself so we can use the normal method
     # this uses Mako caching mechanism, so it's pretty fast
     try:
         template = get_dmp_instance().get_template_loader(app, create=True).get_mako_template(template_name)
-        context = _create_empty_mako_context(template)
-        return build_templateinfo_chain(context['self'], cgi_id)
+        tself = _create_empty_mako_context(template)['self']
+        chain = build_templateinfo_chain(tself, cgi_id)
+        templates = []
+        while tself is not None:
+            templates.append(tself.template)
+            tself = tself.inherits
+        entry = ( tuple(templates), chain )
+
     except MakoException: # includes template not found, template syntax error, compile exception, etc.
         if not force:
             raise
-
-    # if we get here, we probably have a nonexistent file (which is allowed)
-    key = (app.path, template_name)
+        # if we get here, we probably have a nonexistent file (which is allowed)
+        if entry is None or entry[0] or not entry[1][0].is_current():
+            entry = ( (), [ TemplateInfo(app.path, template_name, cgi_id) ] )
+
+    # add to the cache, dropping the least recently used chains
+    with named_chains_lock:
+        NAMED_CHAINS[key] = entry
+        while len(NAMED_CHAINS) > MAX_NAMED_CHAINS:
+            NAMED_CHAINS.popitem(last=False)
+    return entry[1]
+
+
+def _is_named_chain_current(entry, force):
+    '''Returns whether a cached ( templates, chain ) entry of build_templateinfo_chain_by_name() can still be used'''
+    templates, chain = entry
+    if not templates:
+        # a nonexistent file: force=False needs the exception, and in DEBUG mode the file might have been created
+        if not force or settings.DEBUG:
+            return False
+    else:
+        # each level must still be the template its lookup has (it reloads when the file changes)
+        try:
+            for template in templates:
+                if template.lookup.get_template(template.uri) is not template:
+                    return False
+        except MakoException:
+            return False
+    # in DEBUG mode, the static files might have changed
+    if settings.DEBUG:
+        return all( ti.is_current() for ti in chain )
+    return True
+
+
+def get_request_templateinfo_chain(tself, cgi_id=None):
+    '''
+    Returns build_templateinfo_chain(tself, cgi_id), but only builds it once per
+    request.  link_css() and link_js() both need the chain in the same render,
+    and the DEBUG mode checks in build_templateinfo_chain() only need to run once.
+    '''
+    request = tself.context.get('request')
+    if request is None:
+        return build_templateinfo_chain(tself, cgi_id)
+    chains = getattr(request, REQUEST_CHAINS_KEY, None)
+    if chains is None:
+        chains = {}
+        setattr(request, REQUEST_CHAINS_KEY, chains)
+    key = ( tself.template, cgi_id )
     try:
-        ti = NO_TSELF_CACHE[key]
+        return chains[key]
     except KeyError:
-        ti = TemplateInfo(app.path, template_name, cgi_id)
-        # cache if in production mode
-        if not settings.DEBUG:
-            NO_TSELF_CACHE[key] = ti
-    return [ ti ]
+        chain = chains[key] = build_templateinfo_chain(tself, cgi_id)
+        return chain
 
 
 class TemplateInfo(object):
@@ -305,63 +928,211 @@ class TemplateInfo(object):
         if DMP_OPTIONS.get('RUNTIME_SCSS_ENABLED'):
             check_template_scss(os.path.join(self.app_dir, 'styles'), self.template_name)
 
-        # I want short try blocks, so there are several - for example, the first OSError can only occur for one reason: if the os.stat() fails.
-        # I'm using os.stat here instead of os.path.exists because I need the st_mtime.  The os.stat checks that the file exists and gets the modified time in one command.
+        # in production, the dmp_collectstatic manifest has the content hashes of the files, so there are no stat calls
+        manifest = get_manifest()
 
         # the static templatename.css file
-        try:
-            fstat = os.stat(css_file)
-            self.css = '<link rel="stylesheet" type="text/css" href="%s?%s" />' % (posixpath.join(settings.STATIC_URL, self.app_url, 'styles', self.template_name + '.css'), cgi_id if cgi_id != None else int(fstat.st_mtime))
-        except OSError:
+        version = _get_static_version(css_file, posixpath.join(self.app_url, 'styles', self.template_name + '.css'), manifest)
+        if version is not None:
+            css_url = posixpath.join(settings.STATIC_URL, self.app_url, 'styles', self.template_name + '.css')
+            inline = self.read_inline(css_file, 'css', css_url)
+            if inline is not None:
+                self.css = '<style type="text/css">%s</style>' % inline
+                self.css_href = None
+            else:
+                self.css_href = '%s?%s' % (css_url, cgi_id if cgi_id != None else version)
+                self.css = '<link rel="stylesheet" type="text/css" href="%s" />' % self.css_href
+            self.css_file = css_file
+        else:
             self.css = None
+            self.css_href = None
+            self.css_file = None
 
         # the mako-rendered templatename.cssm file
-        try:
-            fstat = os.stat(cssm_file)
+        if _static_exists(cssm_file, posixpath.join(self.app_url, 'styles', self.template_name + '.cssm'), manifest):
             self.cssm = self.template_name + '.cssm'
-        except OSError:
+        else:
             self.cssm = None
 
         # the static templatename.js file
-        try:
-            fstat = os.stat(js_file)
-            self.js = '<script src="%s?%s"></script>' % (posixpath.join(settings.STATIC_URL, self.app_url, 'scripts', self.template_name + '.js'), cgi_id if cgi_id != None else int(fstat.st_mtime))
-        except OSError:
+        version = _get_static_version(js_file, posixpath.join(self.app_url, 'scripts', self.template_name + '.js'), manifest)
+        if version is not None:
+            js_url = posixpath.join(settings.STATIC_URL, self.app_url, 'scripts', self.template_name + '.js')
+            inline = self.read_inline(js_file, 'js', js_url)
+            if inline is not None:
+                self.js = '<script>%s</script>' % inline
+                self.js_href = None
+            else:
+                self.js_href = '%s?%s' % (js_url, cgi_id if cgi_id != None else version)
+                self.js = '<script src="%s"></script>' % self.js_href
+            self.js_file = js_file
+        else:
             self.js = None
+            self.js_href = None
+            self.js_file = None
 
         # the mako-rendered templatename.jsm file
-        try:
-            fstat = os.stat(jsm_file)
+        if _static_exists(jsm_file, posixpath.join(self.app_url, 'scripts', self.template_name + '.jsm'), manifest):
             self.jsm = self.template_name + '.jsm'
-        except OSError:
+        else:
             self.jsm = None
 
+        # the urls of the .cssm/.jsm files that are promoted to static files, by kind (see get_promoted_href)
+        self.promoted = {}
+
+        # the link parts of the named chains that start with this template (see link_template_css)
+        self.links = {}
+
+        # in DEBUG mode, the modified times that is_current() checks
+        self.signature = self.get_signature() if settings.DEBUG else None
+
+
+    def read_inline(self, filename, kind, url):
+        '''
+        Returns the (minified) content of a static .css/.js file to place directly in the
+        page, or None if the file should be linked.  Files are inlined when they are
+        smaller than the INLINE_JS_CSS_SIZE option (in bytes), which saves a request
+        for each tiny file.  Like minification, this only happens when DEBUG is False.
+        '''
+        max_size = DMP_OPTIONS.get('INLINE_JS_CSS_SIZE', 0)
+        if not max_size or settings.DEBUG:
+            return None
+        # reading one byte past the limit tells whether the file is too large without a stat call
+        try:
+            with open(filename, 'rb') as fin:
+                content = fin.read(max_size + 1)
+        except OSError:
+            return None
+        if len(content) > max_size:
+            return None
+        try:
+            text = content.decode(settings.DEFAULT_CHARSET or 'utf8')
+        except UnicodeDecodeError:
+            # a file in another encoding is linked, so the browser decodes it
+            return None
+        # a closing tag in the text would end the <style>/<script> early
+        if RE_CLOSING_TAG.search(text):
+            return None
+        if kind == 'css':
+            text = _absolute_css_urls(text, posixpath.dirname(url))
+        minifier = DMP_OPTIONS.get('RUNTIME_CSSMIN' if kind == 'css' else 'RUNTIME_JSMIN')
+        if minifier:
+            text = getattr(minifier, 'minify', minifier)(text)
+        return text
+
+
+    def get_signature(self):
+        '''
+        Returns the modified times that tell whether this object is still current:
+        the styles and scripts directories (files added or removed) and the .css and
+        .js files (their times are in the links).  The .cssm and .jsm files are rendered
+        through Mako, which checks them itself.
+        '''
+        return (
+            _get_mtime(os.path.join(self.app_dir, 'styles')),
+            _get_mtime(os.path.join(self.app_dir, 'scripts')),
+            _get_mtime(os.path.join(self.app_dir, 'styles', '%s.css' % self.template_name)) if self.css else None,
+            _get_mtime(os.path.join(self.app_dir, 'scripts', '%s.js' % self.template_name)) if self.js else None,
+        )
+
+
+    def is_current(self):
+        '''Returns whether the files are unchanged since this object was created (used in DEBUG mode)'''
+        # compile any updated .scss first because it updates the .css file
+        if DMP_OPTIONS.get('RUNTIME_SCSS_ENABLED'):
+            check_template_scss(os.path.join(self.app_dir, 'styles'), self.template_name)
+        return self.signature == self.get_signature()
+
 
     def append_css(self, request, context, html):
         '''Appends the CSS for this template's .css and .cssm files, if they exist, to the html list.'''
         # do we have a css?
         if self.css:
             html.append(self.css)  # the <link> was already created once in the constructor
-        # do we have a cssm?
+        self.append_cssm(request, context, html)
+
+
+    def get_promoted_href(self, kind):
+        '''
+        Returns the static url of this template's rendered .cssm file (kind='css') or .jsm
+        file (kind='js') when it is promoted to a static file, an empty string if it was
+        promoted but rendered nothing, or None if it is rendered into each page.  See the
+        PROMOTE_CSSM_JSM option.  The result is kept in this object.
+        '''
+        if not ( self.cssm if kind == 'css' else self.jsm ) or not is_promote_enabled():
+            return None
+        try:
+            return self.promoted[kind]
+        except KeyError:
+            pass
+        minifier = DMP_OPTIONS.get('RUNTIME_CSSMIN' if kind == 'css' else 'RUNTIME_JSMIN')
+        try:
+            # minify directly rather than through the MinifyCache because this only happens once
+            name = write_promoted(self, kind, get_bundles_dir(), getattr(minifier, 'minify', minifier) or None)
+        except OSError as e:
+            log.warning('could not write the promoted %s file, so it is rendered into the page: %s', kind, e)
+            name = None
+        except Exception as e:
+            # the render without a request failed (such as a name the check didn't catch); the page render reports real errors
+            log.warning('could not render the promoted %s file without a request, so it is rendered into the page: %s', kind, e)
+            name = None
+        href = self.promoted[kind] = posixpath.join(settings.STATIC_URL, BUNDLES_DIR, name) if name else name
+        return href
+
+
+    def get_app_label(self):
+        '''Returns the label of the DMP app this template is in, or None if app_dir isn't a DMP app'''
+        try:
+            return self.app_label
+        except AttributeError:
+            pass
+        self.app_label = None
+        for config in get_dmp_app_configs():
+            if os.path.abspath(config.path) == os.path.abspath(self.app_dir):
+                self.app_label = config.label
+                break
+        return self.app_label
+
+
+    def append_cssm(self, request, context, html):
+        '''Appends the rendered CSS for this template's .cssm file, if it exists, to the html list.'''
         if self.cssm:
             # engine.py already caches these loaders, so no need to cache them again here
             lookup = get_dmp_instance().get_template_loader_for_path(os.path.join(self.app_dir, 'styles'))
-            css_text = lookup.get_template(self.cssm).render(request=request, context=context)
+            template = lookup.get_template(self.cssm)
+            # with LINK_CSSM_JSM, a file that declares its vary_context is linked instead
+            href = get_linked_href(self, 'css', template, request, context)
+            if href is not None:
+                html.append(BUNDLE_TAGS['css'] % href)
+                return
+            css_text = template.render(request=request, context=context)
             if DMP_OPTIONS.get('RUNTIME_CSSMIN'):
                 css_text = DMP_OPTIONS['RUNTIME_CSSMIN'](css_text)
             html.append('<style type="text/css">%s</style>' % css_text)
 
 
-    def append_js(self, request, context, html):
+    def append_js(self, request, context, html, loading=None):
         '''Appends the Javascript for this template's .js and .jsm files, if they exist to the html list.'''
         # do we have a js?
-        if self.js:
+        if self.js_href and loading:
+            html.append(_script_tag(self.js_href, loading))
+        elif self.js:
             html.append(self.js)  # the <script> was already created once in the constructor
-        # do we have a jsm?
+        self.append_jsm(request, context, html)
+
+
+    def append_jsm(self, request, context, html):
+        '''Appends the rendered Javascript for this template's .jsm file, if it exists, to the html list.'''
         if self.jsm:
             # engine.py already caches these loaders, so no need to cache them again here
             lookup = get_dmp_instance().get_template_loader_for_path(os.path.join(self.app_dir, 'scripts'))
-            js_text = lookup.get_template(self.jsm).render(request=request, context=context)
+            template = lookup.get_template(self.jsm)
+            # with LINK_CSSM_JSM, a file that declares its vary_context is linked instead
+            href = get_linked_href(self, 'js', template, request, context)
+            if href is not None:
+                html.append(_script_tag(href))
+                return
+            js_text = template.render(request=request, context=context)
             if DMP_OPTIONS.get('RUNTIME_JSMIN'):
                 js_text = DMP_OPTIONS['RUNTIME_JSMIN'](js_text)
             html.append('<script>%s</script>' % js_text)
@@ -369,9 +1140,503 @@ class TemplateInfo(object):
 
 
 
+#######################################################################
+###   Linked .cssm/.jsm output.  A .cssm/.jsm file that varies by only
+###   a few values (such as the language or the user's role) can declare
+###   them in a module-level block:
+###
+###       <%! vary_context = [ 'LANGUAGE_CODE', 'request.user.is_staff' ] %>
+###
+###   With the LINK_CSSM_JSM option, the page links to the DMP endpoint
+###   below with a digest of those values.  The output is rendered once per
+###   digest, kept in Django's cache, and served with long-lived cache
+###   headers, so browsers fetch it once per variant.
+
+# the prefix of the cache keys for linked output
+LINKED_CACHE_PREFIX = 'dmp-linked'
+
+# key to attach the hash of the source to the Mako Template (part of each digest)
+DMP_SOURCE_HASH_KEY = '_django_mako_plus_source_hash'
+
+
+def get_linked_href(ti, kind, template, request, context):
+    '''
+    Returns the url of the DMP endpoint for a .cssm/.jsm template (a MakoTemplateAdapter)
+    if it is linked rather than rendered into the page, or None if it isn't.  The output
+    is rendered into the cache now if it isn't there already, so the endpoint usually
+    just reads it.
+    '''
+    if not DMP_OPTIONS.get('LINK_CSSM_JSM', False) or request is None:
+        return None
+    names = get_vary_context(template.mako_template)
+    app_label = ti.get_app_label()
+    if names is None or app_label is None:
+        return None
+    filename = ti.cssm if kind == 'css' else ti.jsm
+    digest = get_vary_digest(template.mako_template, _get_vary_values(names, request, context))
+    try:
+        href = reverse('DMP cssm/jsm', kwargs={ 'app': app_label, 'filename': filename, 'digest': digest })
+    except NoReverseMatch:
+        # the DMP urls are in a namespace or otherwise can't be reversed
+        log.warning('the url for linked .cssm/.jsm output could not be reversed, so it is rendered into the page')
+        return None
+    cache = _get_linked_cache()
+    key = _get_linked_key(app_label, filename, digest)
+    if cache.get(key) is None:
+        cache.set(key, _render_linked(template, kind, request, context), DMP_OPTIONS.get('LINK_CSSM_JSM_TIMEOUT', 86400))
+    return href
+
+
+def serve_cssm_jsm(request, app, filename, digest):
+    '''
+    The view that serves linked .cssm/.jsm output (see get_linked_href).  The
+    vary_context values of this request must give the digest in the url, even
+    when the output is in the cache, so a url only serves the variant its
+    requester would get.  The values should therefore come from the request or
+    the context processors, not from a view's context.  When the output isn't
+    in the cache (it expired, or the cache is per-process), it is rendered
+    again from this request.
+    '''
+    kind = 'css' if filename.endswith('.cssm') else 'js'
+    try:
+        config = apps.get_app_config(app)
+    except LookupError:
+        raise Http404('App not found: %s' % app)
+    if config not in get_dmp_app_configs():
+        raise Http404('Not a DMP app: %s' % app)
+    lookup = get_dmp_instance().get_template_loader_for_path(os.path.join(config.path, 'styles' if kind == 'css' else 'scripts'))
+    try:
+        template = lookup.get_template(filename)
+    except TemplateDoesNotExist:
+        raise Http404('File not found: %s' % filename)
+    names = get_vary_context(template.mako_template)
+    if names is None:
+        raise Http404('File does not declare a vary_context: %s' % filename)
+    # the same variables the context processors give the page
+    context = {}
+    request_context = RequestContext(request)
+    with request_context.bind_template(template):
+        for d in request_context:
+            context.update(d)
+    if get_vary_digest(template.mako_template, _get_vary_values(names, request, context)) != digest:
+        raise Http404('Context does not match the digest: %s' % filename)
+    cache = _get_linked_cache()
+    key = _get_linked_key(app, filename, digest)
+    text = cache.get(key)
+    if text is None:
+        text = _render_linked(template, kind, request, None)
+        cache.set(key, text, DMP_OPTIONS.get('LINK_CSSM_JSM_TIMEOUT', 86400))
+    response = HttpResponse(text, content_type='%s; charset=%s' % ( 'text/css' if kind == 'css' else 'application/javascript', settings.DEFAULT_CHARSET ))
+    # the url changes when the output does, so it can be cached for a long time
+    response['Cache-Control'] = 'private, max-age=%s' % DMP_OPTIONS.get('LINK_CSSM_JSM_MAX_AGE', 31536000)
+    return response
+
+
+def get_vary_context(template):
+    '''Returns the vary_context names declared in a Mako template's module-level block, or None if it doesn't declare them'''
+    names = getattr(template.module, 'vary_context', None)
+    if isinstance(names, str):
+        return [ names ]
+    return names
+
+
+def get_vary_digest(template, values):
+    '''Returns the digest of the vary_context values.  It includes a hash of the source so changed files get new urls.'''
+    source_hash = getattr(template, DMP_SOURCE_HASH_KEY, None)
+    if source_hash is None:
+        source_hash = content_hash(template.source.encode('utf8'))
+        setattr(template, DMP_SOURCE_HASH_KEY, source_hash)
+    return content_hash(repr(( source_hash, [ repr(value) for value in values ] )).encode('utf8'))
+
+
+def _get_vary_values(names, request, context):
+    '''Returns the values of the vary_context names.  A name can be dotted, such as "request.user.is_staff".'''
+    values = []
+    for name in names:
+        first, *rest = name.split('.')
+        value = request if first == 'request' else context.get(first)
+        for attr in rest:
+            value = value.get(attr) if isinstance(value, dict) else getattr(value, attr, None)
+        values.append(value)
+    return values
+
+
+def _render_linked(template, kind, request, context):
+    '''Renders and minifies linked .cssm/.jsm output'''
+    text = template.render(request=request, context=context)
+    minifier = DMP_OPTIONS.get('RUNTIME_CSSMIN' if kind == 'css' else 'RUNTIME_JSMIN')
+    if minifier:
+        text = minifier(text)
+    return text
+
+
+def _get_linked_cache():
+    '''Returns the Django cache for linked output (the LINK_CSSM_JSM_ALIAS option)'''
+    return caches[DMP_OPTIONS.get('LINK_CSSM_JSM_ALIAS', 'default')]
+
+
+def _get_linked_key(app_label, filename, digest):
+    '''Returns the cache key of linked output'''
+    return '%s:%s:%s:%s' % ( LINKED_CACHE_PREFIX, app_label, filename, digest )
+
+
+
+
+#######################################################################
+###   A view that serves the scripts/, styles/, and media/ files of
+###   the DMP apps, for small deployments and preview environments
+###   without a separate static file server.
+
+# the app directories that serve_static() serves
+STATIC_DIRS = ( 'scripts', 'styles', 'media' )
+
+# a single byte range: bytes=start-end, bytes=start-, or bytes=-suffix
+RE_RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+@require_safe
+def serve_static(request, app, path):
+    '''
+    Serves a file from the scripts/, styles/, or media/ directory of a DMP app, or
+    a bundle or promoted .cssm/.jsm file when app is the bundles directory (dmp-bundles).
+    With the SERVE_STATIC_FILES option, the DMP urls route STATIC_URL/app/path here.
+
+    The file is sent with a FileResponse, so WSGI servers that support
+    wsgi.file_wrapper send it with sendfile() rather than copying it through Python.
+    When the dmp_collectstatic manifest lists the file, the collected copy in STATIC_ROOT
+    is sent and its content hash is the ETag.  Otherwise the app's file is sent with an
+    ETag from its modified time and size.  Bundles are named by their content hash, which
+    is their ETag.  A .gz file next to the file is sent instead when the client accepts
+    gzip, and single Range requests get a 206 response.
+    '''
+    # find the file, without letting the path out of the static directories
+    # (a backslash is a separator on Windows, so parts can't contain one)
+    parts = path.split('/')
+    if any( not part or part.startswith('.') or os.sep in part or ( os.altsep and os.altsep in part ) for part in parts ):
+        raise Http404('File not found: %s/%s' % ( app, path ))
+    if app == BUNDLES_DIR:
+        if len(parts) != 1 or not getattr(settings, 'STATIC_ROOT', None):
+            raise Http404('File not found: %s/%s' % ( app, path ))
+        fullpath = os.path.join(get_bundles_dir(), path)
+        etag = os.path.splitext(path)[0]
+    else:
+        config = _get_static_app(app)
+        if config is None or parts[0] not in STATIC_DIRS:
+            raise Http404('File not found: %s/%s' % ( app, path ))
+        if os.path.splitext(path)[1] in ( '.cssm', '.jsm' ):
+            raise Http404('Mako-rendered files are not static: %s/%s' % ( app, path ))
+        manifest = get_manifest()
+        etag = manifest['files'].get(posixpath.join(config.name, path)) if manifest is not None else None
+        if etag is not None:
+            fullpath = os.path.join(os.path.abspath(settings.BASE_DIR), settings.STATIC_ROOT, config.name, *parts)
+        else:
+            fullpath = os.path.join(config.path, *parts)
+
+    # the precompressed version, if the client takes it
+    content_type, encoding = mimetypes.guess_type(fullpath)
+    if encoding is None and _accepts_gzip(request.META.get('HTTP_ACCEPT_ENCODING', '')) and os.path.isfile(fullpath + '.gz'):
+        fullpath += '.gz'
+        encoding = 'gzip'
+        etag = etag + '-gz' if etag is not None else None
+    try:
+        fstat = os.stat(fullpath)
+    except OSError:
+        raise Http404('File not found: %s/%s' % ( app, path ))
+    if not stat.S_ISREG(fstat.st_mode):
+        raise Http404('File not found: %s/%s' % ( app, path ))
+    if etag is None:
+        etag = '%x-%x' % ( int(fstat.st_mtime), fstat.st_size )
+    etag = '"%s"' % etag
+
+    # the browser's copy is current
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match is not None:
+        if etag in ( tag.strip() for tag in if_none_match.split(',') ) or if_none_match.strip() == '*':
+            return _not_modified(etag, fstat)
+    elif not was_modified_since(request.META.get('HTTP_IF_MODIFIED_SINCE'), fstat.st_mtime, fstat.st_size):
+        return _not_modified(etag, fstat)
+
+    # a range of the file
+    start, length = 0, fstat.st_size
+    byte_range = _get_byte_range(request, etag, fstat)
+    if byte_range == ():
+        response = HttpResponse(status=416)
+        response['Content-Range'] = 'bytes */%s' % fstat.st_size
+        return response
+    fin = open(fullpath, 'rb')
+    if byte_range is not None:
+        start, length = byte_range
+        # FileRange has no fileno(), so servers copy just the range rather than sendfile() the rest of the file
+        response = FileResponse(FileRange(fin, start, length), status=206, content_type=content_type or 'application/octet-stream')
+        response['Content-Range'] = 'bytes %s-%s/%s' % ( start, start + length - 1, fstat.st_size )
+    else:
+        response = FileResponse(fin, content_type=content_type or 'application/octet-stream')
+    response['Content-Length'] = length
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(fstat.st_mtime)
+    response['Vary'] = 'Accept-Encoding'
+    if encoding:
+        response['Content-Encoding'] = encoding
+    return response
+
+
+class FileRange(object):
+    '''A file-like object that reads length bytes of a file, starting at start'''
+    def __init__(self, fin, start, length):
+        fin.seek(start)
+        self.file = fin
+        self.remaining = length
+
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size) if size > 0 else b''
+        self.remaining -= len(data)
+        return data
+
+
+    def close(self):
+        self.file.close()
+
+
+def _get_static_app(app):
+    '''Returns the DMP app config for the app part of a static url (its label, or its directory relative to BASE_DIR), or None'''
+    for config in get_dmp_app_configs():
+        if app == config.label or app == '/'.join(os.path.relpath(config.path, settings.BASE_DIR).split(os.path.sep)):
+            return config
+    return None
+
+
+def _accepts_gzip(header):
+    '''Returns whether an Accept-Encoding header allows gzip: listed (or *) with a q-value above zero'''
+    qvalues = {}
+    for item in header.split(','):
+        name, *params = [ piece.strip() for piece in item.split(';') ]
+        q = 1.0
+        for param in params:
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        qvalues[name.lower()] = q
+    return qvalues.get('gzip', qvalues.get('*', 0.0)) > 0
+
+
+def _get_byte_range(request, etag, fstat):
+    '''
+    Returns the ( start, length ) of the Range header, None to send the whole file (no range,
+    more than one range, or an If-Range that doesn't match), or () if the range can't be satisfied.
+    '''
+    header = request.META.get('HTTP_RANGE')
+    if not header:
+        return None
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if if_range and if_range != etag and if_range != http_date(fstat.st_mtime):
+        return None
+    match = RE_RANGE.match(header.strip())
+    if match is None:
+        return None
+    first, last = match.groups()
+    size = fstat.st_size
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    elif last:
+        start = max(size - int(last), 0)
+        end = size - 1
+    else:
+        return None
+    if start >= size or end < start:
+        return ()
+    return ( start, end - start + 1 )
+
+
+def _not_modified(etag, fstat):
+    '''Returns a 304 response'''
+    response = HttpResponseNotModified()
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(fstat.st_mtime)
+    return response
+
+
+
+
+#######################################################################
+###   The manifest of static files, written by dmp_collectstatic.
+###   It lists the files in the styles/ and scripts/ directories
+###   with a hash of their content.  The hash is the cache-busting id
+###   in the links, so a file keeps its url until its content changes.
+
+# the name of the manifest file in STATIC_ROOT
+MANIFEST_NAME = 'dmp-manifest.json'
+
+# the loaded manifests, by filename (None when one couldn't be read)
+MANIFESTS = {}
+
+# when a missing manifest was last looked for, by filename; it is looked for again after
+# MANIFEST_RECHECK seconds so a server that starts before dmp_collectstatic finishes picks it up
+MISSING_MANIFESTS = {}
+MANIFEST_RECHECK = 60
+
+
+def get_manifest():
+    '''
+    Returns the manifest in STATIC_ROOT, or None if there isn't one.  It is
+    loaded once per server run, and a missing manifest is looked for again every
+    MANIFEST_RECHECK seconds.  The manifest isn't used in DEBUG mode because
+    the files change during development.
+
+    The manifest is a dict:
+
+        {
+            # collected files (relative to STATIC_ROOT) and the hash of their content
+            "files": { "homepage/styles/base.css": "3f2a9c81d0e4", ... },
+            # .cssm/.jsm files, which are rendered at runtime rather than collected
+            "dynamic": [ "homepage/styles/base.cssm", ... ],
+        }
+    '''
+    if settings.DEBUG or not getattr(settings, 'STATIC_ROOT', None):
+        return None
+    filename = os.path.join(os.path.abspath(settings.BASE_DIR), settings.STATIC_ROOT, MANIFEST_NAME)
+    try:
+        return MANIFESTS[filename]
+    except KeyError:
+        pass
+    checked = MISSING_MANIFESTS.get(filename)
+    if checked is not None and time.monotonic() - checked < MANIFEST_RECHECK:
+        return None
+    try:
+        with open(filename, encoding='utf8') as fin:
+            manifest = json.load(fin)
+        manifest['dynamic'] = set(manifest.get('dynamic', ()))
+    except FileNotFoundError:
+        MISSING_MANIFESTS[filename] = time.monotonic()
+        return None
+    except (OSError, ValueError) as e:
+        log.warning('the static file manifest %s could not be read, so modified times are used instead: %s', filename, e)
+        manifest = None
+    MANIFESTS[filename] = manifest
+    MISSING_MANIFESTS.pop(filename, None)
+    return manifest
+
+
+def content_hash(content):
+    '''Returns the hash used to name bundles and version files in the manifest (content is bytes)'''
+    return hashlib.md5(content).hexdigest()[:12]
+
+
+def _get_static_version(filename, static_path, manifest):
+    '''
+    Returns the cache-busting id of a static file: the content hash from the manifest,
+    or the modified time (minutes since 1970) if there isn't a manifest.  Returns None
+    if the file doesn't exist.
+    '''
+    if manifest is not None:
+        return manifest['files'].get(static_path)
+    try:
+        return int(os.stat(filename).st_mtime)
+    except OSError:
+        return None
+
+
+def _static_exists(filename, static_path, manifest):
+    '''Returns whether a .cssm/.jsm file exists, using the manifest if there is one'''
+    if manifest is not None:
+        return static_path in manifest['dynamic']
+    return os.path.exists(filename)
+
+
+
+
+#######################################################################
+###   A cache of minified .cssm/.jsm output.  The rendered text is
+###   usually the same from request to request, so it only needs
+###   to be minified once.
+
+class MinifyCache(object):
+    '''
+    Wraps a minifier function (such as rjsmin.jsmin or rcssmin.cssmin) with a
+    bounded LRU cache keyed by the text.  When the same text comes through again,
+    the minified version is returned without running the minifier.
+
+    The key is the text itself rather than a hashlib digest: the dict already hashes
+    it (much faster than sha1, which costs more than rcssmin on typical files) and
+    compares it on a hit, so there's no chance of a collision.
+
+    engine.py sets RUNTIME_JSMIN and RUNTIME_CSSMIN to instances of this class,
+    so stats() is available on those options:
+
+        DMP_OPTIONS['RUNTIME_CSSMIN'].stats()
+    '''
+    def __init__(self, minify, max_size=500):
+        self.minify = minify
+        self.max_size = max_size
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bytes_skipped = 0
+
+
+    def __call__(self, text):
+        # MINIFY_CACHE_SIZE = 0 turns the cache off
+        if self.max_size <= 0:
+            return self.minify(text)
+        with self.lock:
+            minified = self.cache.get(text)
+            if minified is not None:
+                self.cache.move_to_end(text)
+                self.hits += 1
+                self.bytes_skipped += len(text.encode('utf8'))
+                return minified
+        minified = self.minify(text)
+        with self.lock:
+            self.misses += 1
+            self.cache[text] = minified
+            while len(self.cache) > self.max_size:
+                self.cache.popitem(last=False)
+        return minified
+
+
+    @property
+    def hit_ratio(self):
+        '''The fraction of calls that were served from the cache'''
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+    def stats(self):
+        '''
+        Returns a dict of the cache statistics.  The bytes_skipped value is the total
+        size (utf8 encoded) of the text that didn't have to be minified again because
+        of the cache.  When the cache is off (max_size 0), the statistics stay at zero.
+        '''
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hit_ratio,
+            'bytes_skipped': self.bytes_skipped,
+            'size': len(self.cache),
+        }
+
+
+
+
 #######################################################################
 ###   Utility functions
 
+def _get_mtime(path):
+    '''Returns the modified time of the path, or None if it doesn't exist'''
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+
 def _create_empty_mako_context(template):
     '''
     A small utility function that generates a Mako Context, used to
@@ -8,15 +8,169 @@ from mako.template import Template
 
 from .exceptions import InternalRedirectException, RedirectException
 from .signals import dmp_signal_pre_render_template, dmp_signal_post_render_template, dmp_signal_redirect_exception
+from .static_files import get_preload_header
 from .util import get_dmp_instance, log, DMP_OPTIONS
 
-import os, os.path, sys, mimetypes, logging
+import os, os.path, posixpath, re, stat, sys, mimetypes, logging, threading, time
 
 
 
 ##############################################################
 ###   Looks up Mako templates
 
+class DMPTemplateLookup(TemplateLookup):
+    '''
+    A Mako TemplateLookup that compiles each template uri under its own lock.
+
+    Mako's lookup compiles every template under one mutex, so after a deploy,
+    threads compiling unrelated templates wait on each other.  Here the mutex only
+    guards the table of per-uri locks.  Threads that need the same template still
+    wait for a single compile and then share it from the collection.
+
+    With background_reload=True (and filesystem_checks on), a changed template is
+    recompiled on a background thread.  Requests keep getting the previous version
+    until the new one replaces it in the collection.  If the new version doesn't
+    compile, the previous one keeps running until the file changes again.
+
+    Finding the file for a uri probes each search directory on disk.  The results,
+    including "not found", are kept in an index for index_ttl seconds (None keeps
+    them until restart, 0 turns the index off).  Repeated lookups of missing
+    templates, such as fallback templates for urls without views, then make no
+    filesystem calls.
+    '''
+    # the index is cleared when it reaches this size (in case of many made-up names)
+    MAX_INDEX_SIZE = 10000
+
+    def __init__(self, *args, background_reload=False, index_ttl=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.background_reload = background_reload
+        self.index_ttl = index_ttl
+        self._index = {}        # uri -> ( expires, filename or None )
+        self._uri_locks = {}
+        self._reloading = {}    # uri -> the file mtime being recompiled (or that failed to compile)
+
+
+    def get_template(self, uri):
+        '''Returns the Mako template for the uri, finding its file through the index'''
+        try:
+            if self.filesystem_checks:
+                return self._check(uri, self._collection[uri])
+            return self._collection[uri]
+        except KeyError:
+            pass
+        filename = self.find_filename(uri)
+        if filename is None:
+            raise TopLevelLookupException("Cant locate template for uri %r" % uri)
+        try:
+            return self._load(filename, uri)
+        except IOError:
+            # the file went away since we indexed it
+            self._index.pop(uri, None)
+            raise TopLevelLookupException("Cant locate template for uri %r" % uri)
+
+
+    def find_filename(self, uri):
+        '''Returns the first file in the search directories for the uri, or None if it doesn't exist'''
+        if self.index_ttl != 0:
+            entry = self._index.get(uri)
+            if entry is not None and (entry[0] is None or entry[0] > time.monotonic()):
+                return entry[1]
+        # probe the directories (this is how Mako's lookup finds files)
+        filename = None
+        u = re.sub(r'^\/+', '', uri)
+        for dir_ in self.directories:
+            # make sure the path separators are posix
+            dir_ = dir_.replace(os.path.sep, posixpath.sep)
+            srcfile = posixpath.normpath(posixpath.join(dir_, u))
+            if os.path.isfile(srcfile):
+                filename = srcfile
+                break
+        if self.index_ttl != 0:
+            if len(self._index) >= self.MAX_INDEX_SIZE:
+                self._index.clear()
+            self._index[uri] = ( None if self.index_ttl is None else time.monotonic() + self.index_ttl, filename )
+        return filename
+
+
+    def _load(self, filename, uri):
+        with self._mutex:
+            uri_lock = self._uri_locks.get(uri)
+            if uri_lock is None:
+                uri_lock = self._uri_locks[uri] = threading.RLock()
+        try:
+            with uri_lock:
+                try:
+                    # try the collection one more time in case another thread just compiled it
+                    return self._collection[uri]
+                except KeyError:
+                    pass
+                try:
+                    self._collection[uri] = template = self._compile(filename, uri)
+                    return template
+                except:
+                    # if compilation fails, ensure the template isn't left in the collection
+                    self._collection.pop(uri, None)
+                    raise
+        finally:
+            with self._mutex:
+                if self._uri_locks.get(uri) is uri_lock:
+                    del self._uri_locks[uri]
+
+
+    def _compile(self, filename, uri):
+        '''Creates the Mako template object (the same way Mako's lookup does)'''
+        if self.modulename_callable is not None:
+            module_filename = self.modulename_callable(filename, uri)
+        else:
+            module_filename = None
+        return Template(
+            uri=uri,
+            filename=posixpath.normpath(filename),
+            lookup=self,
+            module_filename=module_filename,
+            **self.template_args
+        )
+
+
+    def _check(self, uri, template):
+        '''Called by get_template() when filesystem_checks is on'''
+        if not self.background_reload or template.filename is None:
+            try:
+                return super()._check(uri, template)
+            except TemplateLookupException:
+                self._index.pop(uri, None)
+                raise
+        try:
+            mtime = os.stat(template.filename)[stat.ST_MTIME]
+        except OSError:
+            # the file is gone, so let Mako remove it and raise
+            self._index.pop(uri, None)
+            return super()._check(uri, template)
+        if template.module._modified_time < mtime:
+            with self._mutex:
+                if self._reloading.get(uri, -1) >= mtime:
+                    return template    # already recompiling this version, or it failed
+                self._reloading[uri] = mtime
+            log.info('template %s changed; recompiling in the background', uri)
+            threading.Thread(target=self._reload, args=( template.filename, uri, mtime ), daemon=True).start()
+        return template
+
+
+    def _reload(self, filename, uri, mtime):
+        '''Recompiles a changed template on a background thread, then swaps it into the collection'''
+        try:
+            template = self._compile(filename, uri)
+        except Exception:
+            # the mtime stays in _reloading so we don't retry until the file changes again
+            log.exception('template %s failed to compile; the previous version is still in use', uri)
+            return
+        self._collection[uri] = template
+        with self._mutex:
+            if self._reloading.get(uri) == mtime:
+                del self._reloading[uri]
+
+
+
 class MakoTemplateLoader:
     '''Renders Mako templates.'''
     def __init__(self, app_path, template_subdir='templates'):
@@ -50,7 +204,11 @@ class MakoTemplateLoader:
         self.template_search_dirs.append(settings.BASE_DIR)
 
         # create the actual Mako TemplateLookup, which does the actual work
-        self.tlookup = TemplateLookup(directories=self.template_search_dirs, imports=DMP_OPTIONS['DEFAULT_TEMPLATE_IMPORTS'], module_directory=self.cache_root, collection_size=2000, filesystem_checks=settings.DEBUG, input_encoding=DMP_OPTIONS.get('DEFAULT_TEMPLATE_ENCODING', 'utf-8'))
+        # with TEMPLATES_BACKGROUND_RELOAD, changed templates are recompiled in the background (even when DEBUG=False)
+        # TEMPLATES_INDEX_TTL is how long found (and not found) template files are remembered
+        background_reload = DMP_OPTIONS.get('TEMPLATES_BACKGROUND_RELOAD', False)
+        index_ttl = DMP_OPTIONS.get('TEMPLATES_INDEX_TTL', 1 if settings.DEBUG else 60)
+        self.tlookup = DMPTemplateLookup(directories=self.template_search_dirs, imports=DMP_OPTIONS['DEFAULT_TEMPLATE_IMPORTS'], module_directory=self.cache_root, collection_size=2000, filesystem_checks=settings.DEBUG or background_reload, background_reload=background_reload, index_ttl=index_ttl, input_encoding=DMP_OPTIONS.get('DEFAULT_TEMPLATE_ENCODING', 'utf-8'))
 
 
     def get_template(self, template):
@@ -222,7 +380,13 @@ class MakoTemplateAdapter(object):
             if status is None:
                 status = 200
             content = self.render(context=context, request=request, def_name=def_name)
-            return HttpResponse(content.encode(charset), content_type='%s; charset=%s' % (content_type, charset), status=status)
+            response = HttpResponse(content.encode(charset), content_type='%s; charset=%s' % (content_type, charset), status=status)
+            # let the browser start on the css/js files the page links while it reads the html
+            if DMP_OPTIONS.get('PRELOAD_JS_CSS', False):
+                preload = get_preload_header(request)
+                if preload:
+                    response['Link'] = preload
+            return response
 
         except RedirectException: # redirect to another page
             e = sys.exc_info()[1]
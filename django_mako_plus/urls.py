@@ -1,12 +1,19 @@
+import django
+from django.conf import settings
 from django.conf.urls import url
+from django.core.exceptions import ImproperlyConfigured
 try:
-    from django.urls.resolvers import RegexURLPattern     # Django 1.10+
+    from django.urls.resolvers import RegexURLPattern, ResolverMatch      # Django 1.10+
     from django.urls.exceptions import Resolver404
 except ImportError:
-    from django.core.urlresolvers import RegexURLPattern  # Django 1.9
+    from django.core.urlresolvers import RegexURLPattern, ResolverMatch  # Django 1.9
     from django.core.urlresolvers import Resolver404
-from .router import route_request
+from .router import route_request, route_request_async
+from .static_files import serve_cssm_jsm, serve_static
 from .registry import is_dmp_app
+from .util import DMP_OPTIONS
+
+import re
 
 
 
@@ -48,32 +55,135 @@ class DMPRegexPattern(RegexURLPattern):
 
 
 
+#########################################################
+###   A single-pass pattern for all of the DMP urls
+
+# the leading names of a DMP url, in one scan:
+#     group 1: app or page
+#     group 2: the slash after an app
+#     group 3: page (after an app)
+#     group 4: function (after an app/page)
+#     group 5: function (after a page)
+RE_DMP_PATH = re.compile(r'([_a-zA-Z0-9\-]+)(?:(/)(?:([_a-zA-Z0-9\-]+)(?:\.([_a-zA-Z0-9\.\-]+))?)?|\.([_a-zA-Z0-9\.\-]*))?')
+
+
+def match_dmp_path(path):
+    '''
+    Classifies a url path into the DMP router variables with a single scan of
+    the path, then checks the app name against the set of DMP apps.
+
+    Returns ( pattern name, kwargs ), exactly as the first matching regex pattern
+    in urlpatterns below would.  Returns None if no pattern matches, and for paths
+    with line breaks (the regex dot doesn't match them, so the regex patterns
+    decide those).
+    '''
+    if not path:
+        return 'DMP /', {}
+    if '\n' in path:
+        return None
+    match = RE_DMP_PATH.match(path)
+    if match is None:
+        return None
+    first, slash, page, function, page_function = match.groups()
+
+    # /app, /app/page, /app/page.function
+    if slash is not None and is_dmp_app(first):
+        if function is not None:
+            return 'DMP /app/page.function', { 'dmp_router_app': first, 'dmp_router_page': page, 'dmp_router_function': function, 'urlparams': _get_urlparams(path, match.end()) }
+        if page is not None:
+            return 'DMP /app/page', { 'dmp_router_app': first, 'dmp_router_page': page, 'urlparams': _get_urlparams(path, match.end(3)) }
+        if match.end() == len(path):
+            return 'DMP /app', { 'dmp_router_app': first }
+    elif match.end(1) == len(path) and is_dmp_app(first):
+        return 'DMP /app', { 'dmp_router_app': first }
+
+    # /page.function, /page
+    if page_function is not None:
+        return 'DMP /page.function', { 'dmp_router_page': first, 'dmp_router_function': page_function, 'urlparams': _get_urlparams(path, match.end()) }
+    return 'DMP /page', { 'dmp_router_page': first, 'urlparams': _get_urlparams(path, match.end(1)) }
+
+
+def _get_urlparams(path, start):
+    '''Returns the urlparams that begin at start: skips one leading slash and drops one trailing slash.'''
+    if path.startswith('/', start):
+        start += 1
+    end = len(path)
+    if end - 1 >= start and path.endswith('/'):
+        end -= 1
+    return path[start:end]
+
+
+class DMPPathPattern(RegexURLPattern):
+    '''
+    Resolves every DMP url form with match_dmp_path() rather than trying the
+    regex patterns one after another.  This avoids several regex matches and the
+    Resolver404 that DMPRegexPattern raises when the first part of the url
+    is not a DMP app.
+
+    The regex patterns stay in urlpatterns after this one.  They are used for
+    reverse() by name and for the few paths match_dmp_path() leaves to them.
+    '''
+    def __init__(self, callback, default_args=None):
+        # the regex is only seen by Django's system checks and reverse(); resolve() doesn't use it
+        super().__init__(r'^', callback, default_args)
+
+    def resolve(self, path):
+        match = match_dmp_path(path)
+        if match is None:
+            return None
+        name, kwargs = match
+        kwargs.update(self.default_args)
+        return ResolverMatch(self.callback, (), kwargs, name)
+
+
+
 #########################################################
 ###   The default DMP url patterns
 
 # FYI, even though the valid python identifier is [_A-Za-z][_a-zA-Z0-9]*, I'm simplifying it to [_a-zA-Z0-9]+ because it works for our purposes
 
+# under ASGI, the async router awaits async views without a thread per request
+# Django only awaits coroutine views in 3.1+; before that, each request would get an un-awaited coroutine
+if DMP_OPTIONS.get('ASYNC_ROUTER', False):
+    if django.VERSION < (3, 1):
+        raise ImproperlyConfigured('The DMP ASYNC_ROUTER option requires Django 3.1+ (async views), but this is Django {}.  Please remove it from settings.py.'.format(django.get_version()))
+    router = route_request_async
+else:
+    router = route_request
+
 urlpatterns = [
+    # rendered .cssm/.jsm output that is linked rather than placed in the page (see LINK_CSSM_JSM)
+    # this comes first because DMPPathPattern would take it as a page
+    url(r'^dmp-linked/(?P<app>[_a-zA-Z0-9\-]+)/(?P<filename>[_a-zA-Z0-9\-\.]+\.(?:cssm|jsm))/(?P<digest>[0-9a-f]+)$', serve_cssm_jsm, name='DMP cssm/jsm'),
+
+    # all of the patterns below in a single pass (see DMPPathPattern above)
+    DMPPathPattern(router),
+
     # these are in order of specificity, with the most specific ones at the top
 
     # /app/page.function/urlparams
-    DMPRegexPattern(r'^(?P<dmp_router_app>[_a-zA-Z0-9\-]+)/(?P<dmp_router_page>[_a-zA-Z0-9\-]+)\.(?P<dmp_router_function>[_a-zA-Z0-9\.\-]+)/?(?P<urlparams>.*?)/?$', route_request, name='DMP /app/page.function'),
+    DMPRegexPattern(r'^(?P<dmp_router_app>[_a-zA-Z0-9\-]+)/(?P<dmp_router_page>[_a-zA-Z0-9\-]+)\.(?P<dmp_router_function>[_a-zA-Z0-9\.\-]+)/?(?P<urlparams>.*?)/?$', router, name='DMP /app/page.function'),
 
     # /app/page/urlparams
-    DMPRegexPattern(r'^(?P<dmp_router_app>[_a-zA-Z0-9\-]+)/(?P<dmp_router_page>[_a-zA-Z0-9\-]+)/?(?P<urlparams>.*?)/?$', route_request, name='DMP /app/page'),
+    DMPRegexPattern(r'^(?P<dmp_router_app>[_a-zA-Z0-9\-]+)/(?P<dmp_router_page>[_a-zA-Z0-9\-]+)/?(?P<urlparams>.*?)/?$', router, name='DMP /app/page'),
 
     # /app
     # FYI: /app/urlparams can't happen because the first urlparam would be captured as /app/page in the previous pattern
-    DMPRegexPattern(r'^(?P<dmp_router_app>[_a-zA-Z0-9\-]+?)/?$', route_request, name='DMP /app'),
+    DMPRegexPattern(r'^(?P<dmp_router_app>[_a-zA-Z0-9\-]+?)/?$', router, name='DMP /app'),
 
     # /page.function/urlparams
-    url(r'^(?P<dmp_router_page>[_a-zA-Z0-9\-]+)\.(?P<dmp_router_function>[_a-zA-Z0-9\.\-]*)/?(?P<urlparams>.*?)/?$', route_request, name='DMP /page.function'),
+    url(r'^(?P<dmp_router_page>[_a-zA-Z0-9\-]+)\.(?P<dmp_router_function>[_a-zA-Z0-9\.\-]*)/?(?P<urlparams>.*?)/?$', router, name='DMP /page.function'),
 
     # /page/urlparams
-    url(r'^(?P<dmp_router_page>[_a-zA-Z0-9\-]+)/?(?P<urlparams>.*?)/?$', route_request, name='DMP /page'),
+    url(r'^(?P<dmp_router_page>[_a-zA-Z0-9\-]+)/?(?P<urlparams>.*?)/?$', router, name='DMP /page'),
 
     # / with nothing else
     # FYI: /urlparams can't happen because it would be captured as /page in the previous pattern
-    url(r'^$', route_request, name='DMP /'),
+    url(r'^$', router, name='DMP /'),
 ]
 
+# the scripts/, styles/, and media/ files of the DMP apps, at STATIC_URL (see SERVE_STATIC_FILES)
+# this goes first because DMPPathPattern would take it as a page
+if DMP_OPTIONS.get('SERVE_STATIC_FILES', False) and settings.STATIC_URL.startswith('/'):
+    urlpatterns.insert(0, url(r'^%s(?P<app>[_a-zA-Z0-9\-\.]+)/(?P<path>.+)$' % re.escape(settings.STATIC_URL.lstrip('/')), serve_static, name='DMP static'))
+
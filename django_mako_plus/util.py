@@ -3,6 +3,13 @@ from django.conf import settings
 from django.core.exceptions import ImproperlyConfigured
 
 import os, os.path, subprocess, sys, time, base64, importlib
+import asyncio, functools
+
+# asgiref ships with Django 3.0+ and keeps the database connections on the right threads
+try:
+    from asgiref.sync import sync_to_async, async_to_sync
+except ImportError:
+    sync_to_async = async_to_sync = None
 
 
 # this is populated with the dictionary of options in engine.py when
@@ -89,6 +96,40 @@ class URLParamList(list):
         return super().__getitem__(idx)
 
 
+#################################################################
+###   Moving between sync and async code - used by router.py
+
+def is_async_callable(obj):
+    '''Returns whether calling obj returns a coroutine (a coroutine function or an object with an async __call__)'''
+    return asyncio.iscoroutinefunction(obj) or asyncio.iscoroutinefunction(getattr(obj, '__call__', None))
+
+
+async def run_sync(func, *args, **kwargs):
+    '''
+    Runs a sync function in a worker thread and returns its result, so it doesn't block
+    the event loop.  Uses asgiref when it is available (Django 3.0+).
+    '''
+    if sync_to_async is not None:
+        return await sync_to_async(func)(*args, **kwargs)
+    return await asyncio.get_event_loop().run_in_executor(None, functools.partial(func, *args, **kwargs))
+
+
+def run_async(awaitable):
+    '''
+    Runs an awaitable to completion from sync code and returns its result.
+    Uses asgiref when it is available (Django 3.0+).
+    '''
+    if async_to_sync is not None:
+        async def wrapper():
+            return await awaitable
+        return async_to_sync(wrapper)()
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(awaitable)
+    finally:
+        loop.close()
+
+
 #################################################################
 ###   File locking context manager - used by sass.py
 
@@ -84,6 +84,7 @@ setup(
   author_email='ca@byu.edu',
   url="http://django-mako-plus.readthedocs.io/",
   download_url="https://github.com/doconix/django-mako-plus/archive/master.zip",
+  python_requires='>=3.5',
 #  package_dir={ MODULE_NAME: MODULE_NAME },
   packages=packages,
   package_data = {
@@ -7,6 +7,11 @@ class IceCream(models.Model):
     rating = models.IntegerField(default=0)
 
 
+class Sundae(IceCream):
+    '''Multi-table inheritance: shares its rows with IceCream'''
+    topping = models.TextField(null=True, blank=True)
+
+
 
 class MyInt(int):
     '''Used in testing for specialized types'''
@@ -0,0 +1,39 @@
+# -*- coding:utf-8 -*-
+from mako import runtime, filters, cache
+UNDEFINED = runtime.UNDEFINED
+STOP_RENDERING = runtime.STOP_RENDERING
+__M_dict_builtin = dict
+__M_locals_builtin = locals
+_magic_number = 10
+_modified_time = 1792397861.4079828
+_enable_loop = True
+_template_filename = '/root/package/tests/scripts/linked.jsm'
+_template_uri = 'linked.jsm'
+_source_encoding = 'utf-8'
+import django_mako_plus
+import os, os.path, re, json
+from django_mako_plus import django_syntax, jinja2_syntax, alternate_syntax
+_exports = []
+
+
+vary_context = [ 'request.GET.lang' ] 
+
+def render_body(context,**pageargs):
+    __M_caller = context.caller_stack._push_frame()
+    try:
+        __M_locals = __M_dict_builtin(pageargs=pageargs)
+        request = context.get('request', UNDEFINED)
+        __M_writer = context.writer()
+        __M_writer("\nconsole.log('This is +linked.jsm+ in ")
+        __M_writer(str( request.GET.get('lang') ))
+        __M_writer("');\n")
+        return ''
+    finally:
+        context.caller_stack._pop_frame()
+
+
+"""
+__M_BEGIN_METADATA
+{"filename": "/root/package/tests/scripts/linked.jsm", "uri": "linked.jsm", "source_encoding": "utf-8", "line_map": {"19": 1, "20": 2, "21": 0, "27": 1, "28": 2, "29": 2, "35": 29}}
+__M_END_METADATA
+"""
@@ -0,0 +1,34 @@
+# -*- coding:utf-8 -*-
+from mako import runtime, filters, cache
+UNDEFINED = runtime.UNDEFINED
+STOP_RENDERING = runtime.STOP_RENDERING
+__M_dict_builtin = dict
+__M_locals_builtin = locals
+_magic_number = 10
+_modified_time = 1792397966.6371133
+_enable_loop = True
+_template_filename = '/root/package/tests/templates/component_a.htm'
+_template_uri = 'component_a.htm'
+_source_encoding = 'utf-8'
+import django_mako_plus
+import os, os.path, re, json
+from django_mako_plus import django_syntax, jinja2_syntax, alternate_syntax
+_exports = []
+
+
+def render_body(context,**pageargs):
+    __M_caller = context.caller_stack._push_frame()
+    try:
+        __M_locals = __M_dict_builtin(pageargs=pageargs)
+        __M_writer = context.writer()
+        __M_writer('<p>Component A</p>\n')
+        return ''
+    finally:
+        context.caller_stack._pop_frame()
+
+
+"""
+__M_BEGIN_METADATA
+{"filename": "/root/package/tests/templates/component_a.htm", "uri": "component_a.htm", "source_encoding": "utf-8", "line_map": {"19": 0, "24": 1, "30": 24}}
+__M_END_METADATA
+"""
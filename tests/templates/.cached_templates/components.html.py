@@ -0,0 +1,73 @@
+# -*- coding:utf-8 -*-
+from mako import runtime, filters, cache
+UNDEFINED = runtime.UNDEFINED
+STOP_RENDERING = runtime.STOP_RENDERING
+__M_dict_builtin = dict
+__M_locals_builtin = locals
+_magic_number = 10
+_modified_time = 1792397966.6293235
+_enable_loop = True
+_template_filename = '/root/package/tests/templates/components.html'
+_template_uri = 'components.html'
+_source_encoding = 'utf-8'
+import django_mako_plus
+import os, os.path, re, json
+from django_mako_plus import django_syntax, jinja2_syntax, alternate_syntax
+_exports = ['content']
+
+
+def _mako_get_namespace(context, name):
+    try:
+        return context.namespaces[(__name__, name)]
+    except KeyError:
+        _mako_generate_namespaces(context)
+        return context.namespaces[(__name__, name)]
+def _mako_generate_namespaces(context):
+    ns = runtime.TemplateNamespace('widgets', context._clean_inheritance_tokens(), templateuri='component_b.htm', callables=None,  calling_uri=_template_uri)
+    context.namespaces[(__name__, 'widgets')] = ns
+
+def _mako_inherit(template, context):
+    _mako_generate_namespaces(context)
+    return runtime._inherit_from(context, 'base.htm', _template_uri)
+def render_body(context,**pageargs):
+    __M_caller = context.caller_stack._push_frame()
+    try:
+        __M_locals = __M_dict_builtin(pageargs=pageargs)
+        def content():
+            return render_content(context._locals(__M_locals))
+        widgets = _mako_get_namespace(context, 'widgets')
+        __M_writer = context.writer()
+        __M_writer('\n')
+        __M_writer('\n\n')
+        if 'parent' not in context._data or not hasattr(context._data['parent'], 'content'):
+            context['self'].content(**pageargs)
+        
+
+        __M_writer('\n')
+        return ''
+    finally:
+        context.caller_stack._pop_frame()
+
+
+def render_content(context,**pageargs):
+    __M_caller = context.caller_stack._push_frame()
+    try:
+        def content():
+            return render_content(context)
+        widgets = _mako_get_namespace(context, 'widgets')
+        __M_writer = context.writer()
+        __M_writer('\n    ')
+        runtime._include_file(context, 'component_a.htm', _template_uri)
+        __M_writer('\n    ')
+        __M_writer(str( widgets.widget() ))
+        __M_writer('\n')
+        return ''
+    finally:
+        context.caller_stack._pop_frame()
+
+
+"""
+__M_BEGIN_METADATA
+{"filename": "/root/package/tests/templates/components.html", "uri": "components.html", "source_encoding": "utf-8", "line_map": {"26": 2, "32": 0, "40": 1, "41": 2, "46": 7, "52": 4, "59": 4, "60": 5, "61": 5, "62": 6, "63": 6, "69": 63}}
+__M_END_METADATA
+"""
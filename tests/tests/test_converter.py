@@ -1,12 +1,14 @@
 from django.apps import apps
-from django.http import HttpResponse
+from django.http import HttpResponse, Http404
 from django.test import TestCase
 from django.template import TemplateDoesNotExist, TemplateSyntaxError
 
-from django_mako_plus import DefaultConverter, set_default_converter, get_default_converter
-from django_mako_plus.util import log
-from tests.models import IceCream, MyInt
+from django_mako_plus import DefaultConverter, ModelQuery, set_default_converter, get_default_converter
+from django_mako_plus.model_cache import ModelCache
+from django_mako_plus.util import log, DMP_OPTIONS
+from tests.models import IceCream, MyInt, Sundae
 import logging
+from unittest import mock
 import os, os.path, datetime, decimal
 
 
@@ -138,6 +140,32 @@ class Tester(TestCase):
         resp = self.client.get('/tests/converter.more_testing/1.23/2026-10-25/abcd/3/')
         self.assertEqual(resp.status_code, 404)
 
+    def test_datetime_learned_format(self):
+        # a non-ISO date is parsed by a later format, which is then remembered for the parameter
+        resp = self.client.get('/tests/converter.more_testing/1.23/Oct%2025%202026/2026-10-25%2014:30/3/')
+        self.assertEqual(resp.status_code, 200)
+        req = resp.wsgi_request
+        self.assertEqual(req.converted_params['dt'], datetime.date(2026, 10, 25))
+        self.assertEqual(req.converted_params['dttm'], datetime.datetime(2026, 10, 25, 14, 30))
+        conv = get_default_converter()
+        self.assertIn('%b %d %Y', conv.learned_formats.values())
+        # the ISO fast path only takes the values the input formats would accept
+        parameter = resp.wsgi_request._dmp_router_callable.parameters[2]
+        calls = []
+        def fromisoformat(value):
+            calls.append(value)
+            return datetime.date(2026, 10, 25)
+        self.assertEqual(conv.parse_datetime('2026-10-25', parameter, [ '%Y-%m-%d' ], fromisoformat), datetime.date(2026, 10, 25))
+        self.assertEqual(calls, [ '2026-10-25' ])
+        for value in ( '20261025', '2026-W43-7', '2026-10-25T14:30+02:00' ):
+            self.assertRaises(ValueError, conv.parse_datetime, value, parameter, [ '%Y-%m-%d' ], fromisoformat)
+        self.assertRaises(ValueError, conv.parse_datetime, '2026-10-25', parameter, [ '%m/%d/%Y' ], fromisoformat)
+        self.assertEqual(len(calls), 1)
+        # a different format still works for the same parameter
+        resp = self.client.get('/tests/converter.more_testing/1.23/2026-10-25/2026-10-25/3/')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.wsgi_request.converted_params['dt'], datetime.date(2026, 10, 25))
+
     def test_decimal(self):
         resp = self.client.get('/tests/converter.more_testing/1.23/2026-10-25/2026-10-25%2014:30:59/3/')
         self.assertEqual(resp.status_code, 200)
@@ -161,6 +189,158 @@ class Tester(TestCase):
         self.assertEqual(req.converted_params['mi'], 103)
         self.assertIsInstance(req.converted_params['mi'], MyInt)
 
+    def test_batch_models(self):
+        # three params of the same model are fetched with one query
+        with self.assertNumQueries(1):
+            resp = self.client.get('/tests/converter.batch_models/1/2/1/')
+        self.assertEqual(resp.status_code, 200)
+        req = resp.wsgi_request
+        self.assertEqual(req.converted_params['ic1'], IceCream.objects.get(id=1))
+        self.assertEqual(req.converted_params['ic2'], IceCream.objects.get(id=2))
+        # repeated params share the instance from the identity map
+        self.assertIs(req.converted_params['ic1'], req.converted_params['ic3'])
+        # missing and bad ids still raise Http404
+        resp = self.client.get('/tests/converter.batch_models/1/5/2/')
+        self.assertEqual(resp.status_code, 404)
+        resp = self.client.get('/tests/converter.batch_models/1/abc/2/')
+        self.assertEqual(resp.status_code, 404)
+
+    def test_model_query(self):
+        # both params are looked up by name in a single query
+        with self.assertNumQueries(1):
+            resp = self.client.get('/tests/converter.model_query/Cherry/Sherbet/')
+        self.assertEqual(resp.status_code, 200)
+        req = resp.wsgi_request
+        self.assertEqual(req.converted_params['ic1'], IceCream.objects.get(name='Cherry'))
+        self.assertEqual(req.converted_params['ic2'], IceCream.objects.get(name='Sherbet'))
+        # only() was applied
+        self.assertIn('rating', req.converted_params['ic1'].get_deferred_fields())
+        # nonexistent name
+        resp = self.client.get('/tests/converter.model_query/Cherry/Vanilla/')
+        self.assertEqual(resp.status_code, 404)
+        # the lookup field is loaded even when only() or defer() leave it out
+        for query in ( ModelQuery(field='name', only=( 'rating', )), ModelQuery(field='name', defer=( 'name', 'rating' )) ):
+            with self.assertNumQueries(1):
+                self.assertEqual(sorted( ic.name for ic in query.get_queryset(IceCream).filter(name__in=[ 'Cherry', 'Sherbet' ]) ), [ 'Cherry', 'Sherbet' ])
+
+    def test_model_cache(self):
+        model_cache = ModelCache([ 'tests.IceCream' ], cache_alias='default')
+        DMP_OPTIONS['RUNTIME_CONVERTER_CACHE'] = model_cache
+        try:
+            # the first hit queries and caches
+            with self.assertNumQueries(1):
+                resp = self.client.get('/tests/converter/s/3/4/1/2/')
+            self.assertEqual(resp.wsgi_request.converted_params['ic'].name, 'Burnt Almond Fudge')
+            # the second hit comes from the cache, as a separate instance
+            with self.assertNumQueries(0):
+                resp2 = self.client.get('/tests/converter/s/3/4/1/2/')
+            self.assertEqual(resp2.wsgi_request.converted_params['ic'], resp.wsgi_request.converted_params['ic'])
+            self.assertIsNot(resp2.wsgi_request.converted_params['ic'], resp.wsgi_request.converted_params['ic'])
+            # saving invalidates
+            ic = IceCream.objects.get(id=2)
+            ic.name = 'Rocky Road'
+            ic.save()
+            self.assertIsNone(model_cache.get(IceCream, 2))
+            resp = self.client.get('/tests/converter/s/3/4/1/2/')
+            self.assertEqual(resp.wsgi_request.converted_params['ic'].name, 'Rocky Road')
+            # an instance read before a save isn't cached after it
+            version = model_cache.get_version(IceCream, 2)
+            stale = IceCream.objects.get(id=2)
+            ic.name = 'Chocolate'
+            ic.save()
+            model_cache.set(IceCream, 2, stale, version)
+            self.assertIsNone(model_cache.get(IceCream, 2))
+            model_cache.local.clear()
+            self.assertIsNone(model_cache.get(IceCream, 2))
+            # saving a multi-table child invalidates the parent's row
+            self.client.get('/tests/converter/s/3/4/1/2/')
+            self.assertIsNotNone(model_cache.get(IceCream, 2))
+            Sundae.objects.create(icecream_ptr=ic, name=ic.name, rating=ic.rating, topping='Fudge')
+            self.assertIsNone(model_cache.get(IceCream, 2))
+            model_cache.local.clear()
+            self.assertIsNone(model_cache.get(IceCream, 2))
+            # deleting invalidates
+            ic.delete()
+            resp = self.client.get('/tests/converter/s/3/4/1/2/')
+            self.assertEqual(resp.status_code, 404)
+        finally:
+            DMP_OPTIONS['RUNTIME_CONVERTER_CACHE'] = None
+            model_cache.disconnect()
+            model_cache.cache.clear()
+
+    def test_list(self):
+        # all models are fetched with one query, in url order
+        with self.assertNumQueries(1):
+            resp = self.client.get('/tests/converter.list_testing/1,2,3/3,1,3/a,b/')
+        self.assertEqual(resp.status_code, 200)
+        req = resp.wsgi_request
+        self.assertEqual(req.converted_params['ints'], [ 1, 2, 3 ])
+        self.assertEqual([ ic.id for ic in req.converted_params['ics'] ], [ 3, 1, 3 ])
+        self.assertEqual(req.converted_params['strs'], [ 'a', 'b' ])
+        # empty values
+        resp = self.client.get('/tests/converter.list_testing/-/-/')
+        self.assertEqual(resp.status_code, 200)
+        req = resp.wsgi_request
+        self.assertEqual(req.converted_params['ints'], [])
+        self.assertEqual(req.converted_params['ics'], [])
+        self.assertEqual(req.converted_params['strs'], [])
+        # bad int, nonexistent model, bad model id
+        resp = self.client.get('/tests/converter.list_testing/1,x/1/')
+        self.assertEqual(resp.status_code, 404)
+        resp = self.client.get('/tests/converter.list_testing/1/1,5/')
+        self.assertEqual(resp.status_code, 404)
+        resp = self.client.get('/tests/converter.list_testing/1/1,x/')
+        self.assertEqual(resp.status_code, 404)
+        # urlparams that aren't in the field's canonical form still match their rows
+        IceCream.objects.filter(id=1).update(rating=7)
+        IceCream.objects.filter(id=2).update(rating=8)
+        conv = DefaultConverter()
+        task = mock.Mock(batch_models=False, model_cache={})
+        with mock.patch.object(conv, 'get_model_query', return_value=ModelQuery(field='rating')):
+            self.assertEqual([ ic.id for ic in conv.convert_ids_to_models([ '08', '7' ], None, IceCream, task) ], [ 2, 1 ])
+            with self.assertRaises(Http404):
+                conv.convert_ids_to_models([ '08', '99' ], None, IceCream, task)
+        # each request gets its own copy of a list default
+        resp1 = self.client.get('/tests/converter.list_testing/-/-/')
+        resp2 = self.client.get('/tests/converter.list_testing/-/-/')
+        self.assertIsNot(resp1.wsgi_request.converted_params['strs'], resp2.wsgi_request.converted_params['strs'])
+        # in batch mode, list elements are fetched with the other params of the model
+        with self.assertNumQueries(1):
+            resp = self.client.get('/tests/converter.batch_list/1/2,1,3/')
+        self.assertEqual(resp.status_code, 200)
+        req = resp.wsgi_request
+        self.assertEqual([ ic.id for ic in req.converted_params['ics'] ], [ 2, 1, 3 ])
+        self.assertIs(req.converted_params['ics'][1], req.converted_params['ic'])
+        resp = self.client.get('/tests/converter.batch_list/1/2,5/')
+        self.assertEqual(resp.status_code, 404)
+        # and they come from the cross-request cache
+        model_cache = ModelCache([ 'tests.IceCream' ], cache_alias='default')
+        DMP_OPTIONS['RUNTIME_CONVERTER_CACHE'] = model_cache
+        try:
+            self.client.get('/tests/converter.list_testing/1/1,2/')
+            with self.assertNumQueries(0):
+                resp = self.client.get('/tests/converter.list_testing/1/2,1/')
+            self.assertEqual([ ic.id for ic in resp.wsgi_request.converted_params['ics'] ], [ 2, 1 ])
+        finally:
+            DMP_OPTIONS['RUNTIME_CONVERTER_CACHE'] = None
+            model_cache.disconnect()
+            model_cache.cache.clear()
+
+    def test_dispatch_cache(self):
+        conv = TestingConverter2()
+        self.assertIs(conv.get_converter_func(MyInt).__func__, TestingConverter2.convert_myint)
+        self.assertIs(conv.get_converter_func(int).__func__, DefaultConverter.convert_number)
+        self.assertIn(MyInt, conv.dispatch_cache)
+        # models match by subclass
+        self.assertIs(conv.get_converter_func(IceCream).__func__, DefaultConverter.convert_id_to_model)
+        # no converter is cached as None
+        self.assertIsNone(conv.get_converter_func(complex))
+        self.assertIn(complex, conv.dispatch_cache)
+        # adding a converter invalidates the cache
+        conv.add_converter(lambda self, value, parameter, task: complex(value), complex)
+        self.assertNotIn(complex, conv.dispatch_cache)
+        self.assertIsNotNone(conv.get_converter_func(complex))
+
     def test_custom_convert_function(self):
         resp = self.client.get('/tests/converter.custom_convert_function/1/2/3/4/5/6/')
         self.assertEqual(resp.status_code, 200)
@@ -3,12 +3,12 @@ from django.http import HttpResponse
 from django.template import TemplateDoesNotExist
 from django.test import TestCase
 
-from django_mako_plus.util import log
+from django_mako_plus.util import log, DMP_OPTIONS
 from django_mako_plus.util import get_dmp_instance
 from django_mako_plus.template import MakoTemplateAdapter
 from django_mako_plus.template import MakoTemplateLoader
 
-import logging, os, os.path
+import logging, os, os.path, shutil, tempfile, threading, time
 
 
 class Tester(TestCase):
@@ -51,3 +51,76 @@ class Tester(TestCase):
         self.assertIsInstance(loader, MakoTemplateLoader)
         template = loader.get_template('index.basic.html')
         self.assertIsInstance(template, MakoTemplateAdapter)
+
+    def test_template_lookup_threads(self):
+        # a fresh loader, so the templates are cold
+        path = os.path.join(self.tests_app.path, 'templates')
+        loader = get_dmp_instance().get_template_loader_for_path(path, use_cache=False)
+        results = []
+        def load(name):
+            results.append(( name, loader.get_mako_template(name) ))
+        threads = [ threading.Thread(target=load, args=( name, )) for name in ( 'index.html', 'index.basic.html' ) * 4 ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        # each template was compiled once and shared by the threads
+        self.assertEqual(len(results), 8)
+        for name, template in results:
+            self.assertIs(template, loader.get_mako_template(name))
+        self.assertEqual(loader.tlookup._uri_locks, {})
+
+    def test_template_background_reload(self):
+        tempdir = tempfile.mkdtemp()
+        filename = os.path.join(tempdir, 'reload.html')
+        def write(content, mtime):
+            # replace the file in one step so the background compile never sees half a file
+            with open(filename + '.tmp', 'w') as fout:
+                fout.write(content)
+            os.utime(filename + '.tmp', ( mtime, mtime ))
+            os.replace(filename + '.tmp', filename)
+        def render():
+            return loader.get_mako_template('reload.html').render_unicode()
+        DMP_OPTIONS['TEMPLATES_BACKGROUND_RELOAD'] = True
+        log.setLevel(logging.CRITICAL)  # the syntax error below is logged
+        try:
+            now = int(time.time())
+            write('version 1', now - 100)
+            loader = MakoTemplateLoader(tempdir, None)
+            self.assertEqual(render(), 'version 1')
+            # a change is picked up in the background; this request still gets the previous version
+            write('version 2', now + 100)
+            self.assertEqual(render(), 'version 1')
+            for i in range(100):
+                if render() == 'version 2':
+                    break
+                time.sleep(0.05)
+            self.assertEqual(render(), 'version 2')
+            # a syntax error keeps the last good version
+            write('version 3 ${', now + 200)
+            render()
+            time.sleep(0.5)
+            self.assertEqual(render(), 'version 2')
+            self.assertEqual(loader.tlookup._reloading['reload.html'], now + 200)
+        finally:
+            log.setLevel(logging.WARNING)
+            del DMP_OPTIONS['TEMPLATES_BACKGROUND_RELOAD']
+            shutil.rmtree(tempdir)
+
+    def test_template_index(self):
+        tempdir = tempfile.mkdtemp()
+        DMP_OPTIONS['TEMPLATES_INDEX_TTL'] = 60
+        try:
+            loader = MakoTemplateLoader(tempdir, None)
+            self.assertRaises(TemplateDoesNotExist, loader.get_template, 'later.html')
+            self.assertEqual(loader.tlookup._index['later.html'][1], None)
+            # the "not found" is remembered until the ttl runs out
+            with open(os.path.join(tempdir, 'later.html'), 'w') as fout:
+                fout.write('found')
+            self.assertRaises(TemplateDoesNotExist, loader.get_template, 'later.html')
+            loader.tlookup._index['later.html'] = ( time.monotonic() - 1, None )
+            self.assertEqual(loader.get_template('later.html').render(), 'found')
+            self.assertEqual(loader.tlookup._index['later.html'][1], os.path.join(tempdir, 'later.html'))
+        finally:
+            del DMP_OPTIONS['TEMPLATES_INDEX_TTL']
+            shutil.rmtree(tempdir)
@@ -5,6 +5,8 @@ from django_mako_plus.util import log
 
 import logging
 import os, os.path
+from collections import OrderedDict
+from unittest import mock
 
 
 class Tester(TestCase):
@@ -115,3 +117,37 @@ class Tester(TestCase):
         self.assertIsInstance(req._dmp_router_callable, ViewFunctionRouter)
         self.assertEqual(req._dmp_router_callable.module, index)
         self.assertEqual(req._dmp_router_callable.function, index.process_request)
+
+    # the routing variables are computed once per app/page/function
+    def test_cached_route(self):
+        from django_mako_plus.middleware import CACHED_ROUTES
+        resp1 = self.client.get('/tests/index.basic/a%20b/2/')
+        resp2 = self.client.get('/tests/index.basic/3/')
+        self.assertEqual(resp1.status_code, 200)
+        self.assertEqual(resp2.status_code, 200)
+        self.assertIs(CACHED_ROUTES[( 'tests', 'index', 'basic' )].callable, resp2.wsgi_request._dmp_router_callable)
+        self.assertEqual(resp1.wsgi_request.urlparams, [ 'a b', '2' ])
+        self.assertEqual(resp1.wsgi_request.urlparams[5], '')
+        self.assertEqual(resp2.wsgi_request.urlparams, [ '3' ])
+        # class-based views still get the function name from each request's method
+        resp = self.client.post('/tests/index.class_based/')
+        self.assertEqual(resp.wsgi_request.dmp_router_class, 'class_based')
+        self.assertEqual(resp.wsgi_request.dmp_router_function, 'post')
+        resp = self.client.get('/tests/index.class_based/')
+        self.assertEqual(resp.wsgi_request.dmp_router_function, 'get')
+
+
+    # made-up urls push out the least recently used routes rather than filling the cache
+    def test_cached_route_lru(self):
+        from django_mako_plus import middleware
+        with mock.patch.object(middleware, 'MAX_CACHED_ROUTES', 2), mock.patch.object(middleware, 'CACHED_ROUTES', OrderedDict()):
+            real = middleware.get_route('tests', 'index', 'basic')
+            middleware.get_route('tests', 'madeup1', None)
+            self.assertIs(middleware.get_route('tests', 'index', 'basic'), real)
+            middleware.get_route('tests', 'madeup2', None)
+            self.assertEqual(list(middleware.CACHED_ROUTES), [ ( 'tests', 'index', 'basic' ), ( 'tests', 'madeup2', None ) ])
+            middleware.get_route('tests', 'madeup3', None)
+            middleware.get_route('tests', 'madeup4', None)
+            self.assertNotIn(( 'tests', 'index', 'basic' ), middleware.CACHED_ROUTES)
+            self.assertIsNot(middleware.get_route('tests', 'index', 'basic'), real)
+            self.assertIn(( 'tests', 'index', 'basic' ), middleware.CACHED_ROUTES)
@@ -1,9 +1,12 @@
-from django.test import TestCase
+from django.http import Http404, HttpResponseNotFound
+from django.test import TestCase, RequestFactory
+from django.urls import resolve
 
-from django_mako_plus.router import ViewFunctionRouter
+from django_mako_plus import RequestInitMiddleware, route_request_async
+from django_mako_plus.router import ViewFunctionRouter, get_router, CACHED_ROUTERS, ROUTER_LOCKS
 from django_mako_plus.util import log
 
-import logging
+import asyncio, logging, threading
 import os, os.path
 
 
@@ -50,3 +53,50 @@ class Tester(TestCase):
         # PUT method (not defined in class)
         resp = self.client.put('/tests/index.class_based/1/2/3/')
         self.assertEqual(resp.status_code, 405)  # method not allowed
+
+
+    def test_get_router_threads(self):
+        # concurrent first requests for the same view share one router
+        CACHED_ROUTERS.pop(( 'tests.views.converter', 'process_request' ), None)
+        routers = []
+        threads = [ threading.Thread(target=lambda: routers.append(get_router('tests.views.converter', 'process_request'))) for i in range(8) ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(routers), 8)
+        self.assertTrue(all(r is routers[0] for r in routers))
+        self.assertEqual(ROUTER_LOCKS, {})
+
+    def test_async_view(self):
+        # async views and converters through the sync router
+        resp = self.client.get('/tests/index.async_view/1/')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.content, b'async 1 5')
+        resp = self.client.get('/tests/index.async_converter/1/2/')
+        self.assertEqual(resp.content, b'async converter 2 4')
+        # and through the async router
+        self.assertEqual(self.route_async('/tests/index.async_view/3/4/').content, b'async 3 4')
+        self.assertEqual(self.route_async('/tests/index.async_converter/3/4/').content, b'async converter 6 8')
+        self.assertEqual(self.route_async('/tests/index.class_based/1/2/3/').status_code, 200)
+        self.assertEqual(self.route_async('/tests/index.does_not_exist/').status_code, 404)
+
+
+    def route_async(self, path):
+        '''Runs a request through the async middleware path and route_request_async'''
+        request = RequestFactory().get(path)
+        match = resolve(path)
+        async def get_response(request):
+            # the handler's part: the view middleware, then the view
+            await middleware.process_view(request, match.func, match.args, match.kwargs)
+            return await route_request_async(request, *match.args, **match.kwargs)
+        middleware = RequestInitMiddleware(get_response)
+        # the hooks are coroutines, so an async handler doesn't move them to a thread
+        self.assertTrue(asyncio.iscoroutinefunction(middleware.process_view))
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(middleware.__acall__(request))
+        except Http404 as e:
+            return HttpResponseNotFound(str(e))
+        finally:
+            loop.close()
@@ -1,10 +1,21 @@
-from django.test import TestCase
+from django.apps import apps
+from django.test import TestCase, RequestFactory, override_settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.http import Http404
 
 from django_mako_plus.router import ViewFunctionRouter
+from django_mako_plus import static_files
+from django_mako_plus.static_files import link_template_js, MinifyCache, build_templateinfo_chain_by_name, NAMED_CHAINS, _check_context_free, build_templateinfo_chain, get_link_parts, render_links, _build_link_parts, _absolute_css_urls, _create_empty_mako_context, REQUEST_CHAINS_KEY, BUNDLE_URLS, TemplateInfo, MANIFEST_NAME, serve_static, get_manifest, write_hashed_file, get_bundles_dir, get_preload_header
+from django_mako_plus.util import get_dmp_instance, DMP_OPTIONS
 from django_mako_plus.util import log
 
+import copy
+import gzip
+import json
 import logging
-import os, os.path
+import os, os.path, tempfile, shutil
+from unittest import mock
 
 
 class Tester(TestCase):
@@ -14,6 +25,7 @@ class Tester(TestCase):
         # skip debug messages during testing
         cls.loglevel = log.getEffectiveLevel()
         log.setLevel(logging.WARNING)
+        cls.tests_app = apps.get_app_config('tests')
 
     @classmethod
     def tearDownTestData(cls):
@@ -39,3 +51,394 @@ class Tester(TestCase):
         self.assertFalse(b'+static_files.css+' in resp.content)
         self.assertTrue(b'+static_files.cssm+' in resp.content)
 
+
+
+    @override_settings(DEBUG=True)
+    def test_templateinfo_debug_cache(self):
+        # link_css and link_js share one chain in the request
+        resp = self.client.get('/tests/static_files/')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(len(getattr(resp.wsgi_request, REQUEST_CHAINS_KEY)), 1)
+        # the chain is reused while the files are unchanged
+        template = get_dmp_instance().get_template_loader('tests').get_mako_template('static_files.html')
+        tself = _create_empty_mako_context(template)['self']
+        chain1 = build_templateinfo_chain(tself)
+        chain2 = build_templateinfo_chain(tself)
+        self.assertIs(chain1[0], chain2[0])
+        self.assertIs(chain1[1], chain2[1])
+        # and rebuilt when a linked file changes
+        css_file = os.path.join(self.tests_app.path, 'styles', 'base.css')
+        mtime = os.stat(css_file).st_mtime
+        try:
+            os.utime(css_file, ( mtime + 120, mtime + 120 ))
+            chain3 = build_templateinfo_chain(tself)
+            self.assertIs(chain3[0], chain1[0])         # static_files.html didn't change
+            self.assertIsNot(chain3[1], chain1[1])      # base.htm did
+            self.assertTrue(str(int(mtime + 120)) in chain3[1].css)
+        finally:
+            os.utime(css_file, ( mtime, mtime ))
+        # each cgi_id gets its own TemplateInfo
+        chain4 = build_templateinfo_chain(tself, 'v42')
+        self.assertTrue('?v42' in chain4[0].css)
+        self.assertIsNot(chain4[0], build_templateinfo_chain(tself)[0])
+        self.assertIs(chain4[0], build_templateinfo_chain(tself, 'v42')[0])
+        self.assertTrue('?v42' in render_links(tself, 'v42', 'css'))
+        self.assertFalse('?v42' in render_links(tself, None, 'css'))
+
+
+    def test_link_parts(self):
+        template = get_dmp_instance().get_template_loader('tests').get_mako_template('static_files.html')
+        tself = _create_empty_mako_context(template)['self']
+        chain = build_templateinfo_chain(tself)
+        # static tags are joined ahead of time; the .cssm levels are rendered per request
+        parts = get_link_parts(tself, None, 'css')
+        self.assertEqual(parts, ( chain[1].css, chain[1], chain[0].css, chain[0] ))
+        self.assertIs(get_link_parts(tself, None, 'css'), parts)
+        # same html as appending each level
+        for kind in ( 'css', 'js' ):
+            html = []
+            for ti in reversed(chain):
+                getattr(ti, 'append_' + kind)(None, tself.context, html)
+            self.assertEqual(render_links(tself, None, kind), '\n'.join(html))
+
+
+    def test_bundles(self):
+        template = get_dmp_instance().get_template_loader('tests').get_mako_template('static_files.html')
+        tself = _create_empty_mako_context(template)['self']
+        # a chain without the .cssm/.jsm files, so the .css/.js files are next to each other
+        chain = [ copy.copy(ti) for ti in build_templateinfo_chain(tself) ]
+        for ti in chain:
+            ti.cssm = ti.jsm = None
+        static_root = tempfile.mkdtemp()
+        DMP_OPTIONS['BUNDLE_JS_CSS'] = True
+        try:
+            with override_settings(STATIC_ROOT=static_root):
+                BUNDLE_URLS.clear()
+                css, = _build_link_parts(chain, 'css')
+                js, = _build_link_parts(chain, 'js')
+                self.assertRegex(css, r'^<link rel="stylesheet" type="text/css" href="/static/dmp-bundles/[0-9a-f]{12}\.css" />$')
+                self.assertRegex(js, r'^<script src="/static/dmp-bundles/[0-9a-f]{12}\.js"></script>$')
+                # the files are concatenated, supertemplate first
+                with open(os.path.join(static_root, 'dmp-bundles', os.path.basename(js.split('"')[1]))) as fin:
+                    content = fin.read()
+                self.assertLess(content.index('+base.js+'), content.index('+static_files.js+'))
+                # identical chains share the bundle
+                self.assertEqual(_build_link_parts(chain, 'css'), ( css, ))
+                self.assertEqual(len(os.listdir(os.path.join(static_root, 'dmp-bundles'))), 2)
+        finally:
+            del DMP_OPTIONS['BUNDLE_JS_CSS']
+            BUNDLE_URLS.clear()
+            shutil.rmtree(static_root)
+        # without bundling, each file has its own tag
+        self.assertEqual(_build_link_parts(chain, 'css'), ( chain[1].css + '\n' + chain[0].css, ))
+        # relative urls in the css still point to the same place
+        self.assertEqual(
+            _absolute_css_urls('a { background: url("../media/a.png") } @import "b.css"; b { background: url(/x.png) url(data:image/png;base64,AA==) }', '/static/tests/styles'),
+            'a { background: url("/static/tests/media/a.png") } @import "/static/tests/styles/b.css"; b { background: url(/x.png) url(data:image/png;base64,AA==) }',
+        )
+
+
+    def test_manifest(self):
+        static_root = tempfile.mkdtemp()
+        try:
+            with open(os.path.join(static_root, MANIFEST_NAME), 'w') as fout:
+                json.dump({
+                    'files': { 'tests/styles/base.css': '0123456789ab' },
+                    'dynamic': [ 'tests/scripts/base.jsm' ],
+                }, fout)
+            with override_settings(STATIC_ROOT=static_root):
+                ti = TemplateInfo(self.tests_app.path, 'base.htm')
+            # the files and their versions come from the manifest rather than the file system
+            self.assertEqual(ti.css, '<link rel="stylesheet" type="text/css" href="/static/tests/styles/base.css?0123456789ab" />')
+            self.assertIsNone(ti.js)
+            self.assertIsNone(ti.cssm)
+            self.assertEqual(ti.jsm, 'base.jsm')
+        finally:
+            shutil.rmtree(static_root)
+        # the .cssm/.jsm files are listed whatever the copy rules skip
+        static_root = os.path.join(tempfile.mkdtemp(), 'static')
+        try:
+            with override_settings(STATIC_ROOT=static_root):
+                call_command('dmp_collectstatic', quiet=True, skip_dir=[ 'styles' ])
+            with open(os.path.join(static_root, MANIFEST_NAME)) as fin:
+                manifest = json.load(fin)
+            self.assertIn('tests/styles/base.cssm', manifest['dynamic'])
+            self.assertIn('tests/scripts/base.jsm', manifest['dynamic'])
+            self.assertNotIn('tests/styles/base.css', manifest['files'])
+        finally:
+            shutil.rmtree(os.path.dirname(static_root))
+        # a missing manifest is looked for again after a while
+        static_root = tempfile.mkdtemp()
+        try:
+            with override_settings(STATIC_ROOT=static_root):
+                self.assertIsNone(get_manifest())
+                with open(os.path.join(static_root, MANIFEST_NAME), 'w') as fout:
+                    json.dump({ 'files': {}, 'dynamic': [] }, fout)
+                self.assertIsNone(get_manifest())
+                with mock.patch.object(static_files, 'MANIFEST_RECHECK', 0):
+                    self.assertEqual(get_manifest(), { 'files': {}, 'dynamic': set() })
+        finally:
+            shutil.rmtree(static_root)
+        # without a manifest, the modified time is used
+        ti = TemplateInfo(self.tests_app.path, 'base.htm')
+        self.assertTrue(ti.css.endswith('?%s" />' % int(os.stat(os.path.join(self.tests_app.path, 'styles', 'base.css')).st_mtime)))
+        self.assertEqual(ti.cssm, 'base.cssm')
+
+
+    def test_inline(self):
+        DMP_OPTIONS['INLINE_JS_CSS_SIZE'] = 1000
+        try:
+            ti = TemplateInfo(self.tests_app.path, 'base.htm')
+            self.assertEqual(ti.js, "<script>console.log('This is +base.js+');</script>")
+            self.assertTrue(ti.css.startswith('<style type="text/css">'))
+            # files over the size are still linked
+            DMP_OPTIONS['INLINE_JS_CSS_SIZE'] = 10
+            ti = TemplateInfo(self.tests_app.path, 'base.htm')
+            self.assertTrue(ti.js.startswith('<script src="/static/tests/scripts/base.js?'))
+            self.assertTrue(ti.css.startswith('<link '))
+            # files that aren't in the page's charset are linked
+            DMP_OPTIONS['INLINE_JS_CSS_SIZE'] = 1000
+            with tempfile.NamedTemporaryFile(suffix='.js') as fout:
+                fout.write('var s = "caf\u00e9";'.encode('latin-1'))
+                fout.flush()
+                self.assertIsNone(ti.read_inline(fout.name, 'js', '/static/tests/scripts/latin.js'))
+        finally:
+            del DMP_OPTIONS['INLINE_JS_CSS_SIZE']
+
+
+    def test_preload_and_loading(self):
+        # links cached on the template for other renders (here, another cgi_id) aren't preloaded
+        template = get_dmp_instance().get_template_loader('tests').get_mako_template('static_files.html')
+        render_links(_create_empty_mako_context(template)['self'], 'other', 'css')
+        DMP_OPTIONS['PRELOAD_JS_CSS'] = True
+        try:
+            resp = self.client.get('/tests/static_files/')
+        finally:
+            del DMP_OPTIONS['PRELOAD_JS_CSS']
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotIn('?other', resp['Link'])
+        links = resp['Link'].split(', ')
+        self.assertEqual(len(links), 4)
+        self.assertRegex(links[0], r'^</static/tests/styles/base\.css\?\d+>; rel=preload; as=style$')
+        self.assertRegex(links[-1], r'^</static/tests/scripts/static_files\.js\?\d+>; rel=preload; as=script$')
+        # the script tags can be deferred
+        template = get_dmp_instance().get_template_loader('tests').get_mako_template('static_files.html')
+        tself = _create_empty_mako_context(template)['self']
+        html = render_links(tself, None, 'js', 'defer')
+        self.assertEqual(html.count('<script defer src="/static/tests/scripts/'), 2)
+        self.assertEqual(html.count('<script>'), 2)  # the .jsm output runs in place
+        html = link_template_js(RequestFactory().get('/'), 'tests', 'static_files.html', {}, loading='async')
+        self.assertEqual(html.count('<script async src="/static/tests/scripts/'), 2)
+        with self.assertRaises(ValueError):
+            link_template_js(RequestFactory().get('/'), 'tests', 'static_files.html', {}, loading='later')
+
+
+    def test_named_chains(self):
+        NAMED_CHAINS.clear()
+        # the tracked compiled templates are older than their files, so don't let the lookup reload them on every call
+        lookup = get_dmp_instance().get_template_loader('tests').tlookup
+        with mock.patch.object(lookup, 'filesystem_checks', False):
+            chain = build_templateinfo_chain_by_name('tests', 'static_files.html', None)
+            self.assertEqual([ ti.template_name for ti in chain ], [ 'static_files', 'base' ])
+            # the second time comes from the cache
+            with mock.patch('django_mako_plus.static_files._create_empty_mako_context', side_effect=AssertionError('the chain was not cached')):
+                self.assertIs(build_templateinfo_chain_by_name('tests', 'static_files.html', None), chain)
+            # a template that reloads gets a new chain
+            del lookup._collection['base.htm']
+            self.assertIsNot(build_templateinfo_chain_by_name('tests', 'static_files.html', None), chain)
+        # nonexistent templates are cached too, but only so many chains are kept
+        with mock.patch.object(static_files, 'MAX_NAMED_CHAINS', 2):
+            missing = build_templateinfo_chain_by_name('tests', 'nonexistent.html', None)
+            self.assertIs(build_templateinfo_chain_by_name('tests', 'nonexistent.html', None), missing)
+            build_templateinfo_chain_by_name('tests', 'nonexistent2.html', None)
+            self.assertEqual(len(NAMED_CHAINS), 2)
+            self.assertNotIn(( self.tests_app.path, 'static_files.html', None ), NAMED_CHAINS)
+
+
+    def test_promoted(self):
+        # which sources render the same without the request
+        self.assertTrue(_check_context_free('body { color: red }'))
+        self.assertTrue(_check_context_free('a { background: url(${ STATIC_URL }a.png) } ${ settings.DEBUG } ${ len(os.sep) }'))
+        self.assertTrue(_check_context_free('% for x in range(3):\n.c${ x } { }\n% endfor\n<% y = 1 %>${ y }'))
+        self.assertFalse(_check_context_free('${ request.user }'))
+        self.assertFalse(_check_context_free('${ color }'))
+        self.assertFalse(_check_context_free('${ self.attr.x }'))
+        self.assertFalse(_check_context_free('<%include file="other.cssm" />'))
+        # names are only declared in their own scope, and page/block args come from the context
+        self.assertFalse(_check_context_free('<%page args="theme=\'light\'"/>${ theme }'))
+        self.assertFalse(_check_context_free('<%block name="b" args="theme">${ theme }</%block>'))
+        self.assertFalse(_check_context_free('<%def name="f(color)">${ color }</%def>${ color }'))
+        self.assertFalse(_check_context_free('<% y = 1 %><%def name="f()">${ y }</%def>${ f() }'))
+        self.assertTrue(_check_context_free('<%! z = 2 %><%def name="f(color)">${ color } ${ z }</%def>${ f(z) }'))
+        self.assertTrue(_check_context_free('<%def name="f()">${ caller.body() }</%def>\n% for x in range(2):\n<%call expr="f()">${ x }</%call>\n% endfor\n'))
+        # a context-free .jsm is linked as a static file
+        static_root = tempfile.mkdtemp()
+        DMP_OPTIONS['PROMOTE_CSSM_JSM'] = True
+        try:
+            with override_settings(STATIC_ROOT=static_root):
+                ti = TemplateInfo(self.tests_app.path, 'base.htm')
+                href = ti.get_promoted_href('js')
+                self.assertRegex(href, r'^/static/dmp-bundles/[0-9a-f]{12}\.js$')
+                with open(os.path.join(static_root, 'dmp-bundles', os.path.basename(href))) as fin:
+                    self.assertIn('+base.jsm+', fin.read())
+                self.assertEqual(_build_link_parts([ ti ], 'js'), ( ti.js + '\n<script src="%s"></script>' % href, ))
+                # a file that renders to nothing isn't linked
+                with mock.patch('django_mako_plus.static_files.render_promoted', return_value='  '):
+                    ti = TemplateInfo(self.tests_app.path, 'base.htm')
+                    self.assertEqual(ti.get_promoted_href('css'), '')
+                    self.assertEqual(_build_link_parts([ ti ], 'css'), ( ti.css, ))
+                # a file that fails to render without a request is rendered into the page
+                with mock.patch('django_mako_plus.static_files.render_promoted', side_effect=NameError('theme')):
+                    ti = TemplateInfo(self.tests_app.path, 'base.htm')
+                    self.assertIsNone(ti.get_promoted_href('js'))
+                # link_template_js() promotes too, and records the preload on the request
+                NAMED_CHAINS.clear()
+                request = RequestFactory().get('/')
+                html = link_template_js(request, 'tests', 'base.htm', {})
+                self.assertNotIn('+base.jsm+', html)
+                self.assertIn('<script src="%s"></script>' % href, html)
+                self.assertIn('<%s>; rel=preload; as=script' % href, get_preload_header(request))
+        finally:
+            del DMP_OPTIONS['PROMOTE_CSSM_JSM']
+            NAMED_CHAINS.clear()
+            shutil.rmtree(static_root)
+
+
+    def test_linked_cssm_jsm(self):
+        DMP_OPTIONS['LINK_CSSM_JSM'] = True
+        try:
+            cache.clear()
+            html = link_template_js(RequestFactory().get('/?lang=fr'), 'tests', 'linked.html', {})
+            self.assertRegex(html, r'^<script src="/dmp-linked/tests/linked\.jsm/[0-9a-f]{12}"></script>$')
+            href = html.split('"')[1]
+            # the output was rendered into the cache with the page
+            resp = self.client.get(href + '?lang=fr')
+            self.assertEqual(resp.status_code, 200)
+            self.assertIn(b'+linked.jsm+ in fr', resp.content)
+            self.assertTrue(resp['Content-Type'].startswith('application/javascript'))
+            self.assertEqual(resp['Cache-Control'], 'private, max-age=31536000')
+            # each variant has its own url
+            self.assertNotEqual(link_template_js(RequestFactory().get('/?lang=en'), 'tests', 'linked.html', {}), html)
+            # a request with another vary context doesn't get this variant, even from the cache
+            self.assertEqual(self.client.get(href).status_code, 404)
+            self.assertEqual(self.client.get(href + '?lang=en').status_code, 404)
+            # without the cache, the endpoint renders it again if the request has the same vary context
+            cache.clear()
+            resp = self.client.get(href + '?lang=fr')
+            self.assertEqual(resp.status_code, 200)
+            self.assertIn(b'+linked.jsm+ in fr', resp.content)
+            # files without a vary_context are still rendered into the page
+            self.assertIn('+base.jsm+', link_template_js(RequestFactory().get('/'), 'tests', 'base.htm', {}))
+        finally:
+            del DMP_OPTIONS['LINK_CSSM_JSM']
+
+
+    def test_components(self):
+        DMP_OPTIONS['LINK_COMPONENTS'] = True
+        try:
+            resp = self.client.get('/tests/components/')
+        finally:
+            del DMP_OPTIONS['LINK_COMPONENTS']
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn(b'Component B', resp.content)
+        # the component styles load once each, after the supertemplate and before the page
+        content = resp.content.decode('utf8')
+        self.assertEqual(content.count('tests/styles/component_a.css'), 1)
+        self.assertEqual(content.count('tests/styles/component_b.css'), 1)
+        self.assertLess(content.index('tests/styles/base.css'), content.index('tests/styles/component_a.css'))
+        self.assertLess(content.index('tests/styles/component_a.css'), content.index('tests/styles/component_b.css'))
+        # without the option, only the inheritance is followed
+        resp = self.client.get('/tests/components/')
+        self.assertNotIn(b'component_a.css', resp.content)
+
+
+    def test_serve_static(self):
+        factory = RequestFactory()
+        path = os.path.join(self.tests_app.path, 'styles', 'base.css')
+        with open(path, 'rb') as fin:
+            content = fin.read()
+        resp = serve_static(factory.get('/static/tests/styles/base.css'), 'tests', 'styles/base.css')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(b''.join(resp.streaming_content), content)
+        self.assertEqual(resp['Content-Type'], 'text/css')
+        self.assertEqual(int(resp['Content-Length']), len(content))
+        etag = resp['ETag']
+        # conditional and range requests
+        resp = serve_static(factory.get('/', HTTP_IF_NONE_MATCH=etag), 'tests', 'styles/base.css')
+        self.assertEqual(resp.status_code, 304)
+        resp = serve_static(factory.get('/', HTTP_RANGE='bytes=2-5'), 'tests', 'styles/base.css')
+        self.assertEqual(resp.status_code, 206)
+        self.assertEqual(b''.join(resp.streaming_content), content[2:6])
+        self.assertEqual(resp['Content-Range'], 'bytes 2-5/%s' % len(content))
+        resp = serve_static(factory.get('/', HTTP_RANGE='bytes=-3'), 'tests', 'styles/base.css')
+        self.assertEqual(b''.join(resp.streaming_content), content[-3:])
+        resp = serve_static(factory.get('/', HTTP_RANGE='bytes=2-5', HTTP_IF_RANGE='"old"'), 'tests', 'styles/base.css')
+        self.assertEqual(resp.status_code, 200)
+        resp = serve_static(factory.get('/', HTTP_RANGE='bytes=%s-' % len(content)), 'tests', 'styles/base.css')
+        self.assertEqual(resp.status_code, 416)
+        # only the static directories, and not the mako-rendered files
+        for app, filename in ( ( 'tests', 'styles/base.cssm' ), ( 'tests', 'styles/../views/index.py' ), ( 'tests', 'views/index.py' ), ( 'notanapp', 'styles/base.css' ), ( 'tests', 'styles/..%sviews' % os.sep ) ):
+            with self.assertRaises(Http404):
+                serve_static(factory.get('/'), app, filename)
+        # the collected file, its manifest hash, and its gzipped sibling
+        static_root = tempfile.mkdtemp()
+        try:
+            os.makedirs(os.path.join(static_root, 'tests', 'styles'))
+            with open(os.path.join(static_root, 'tests', 'styles', 'base.css'), 'wb') as fout:
+                fout.write(b'collected')
+            with gzip.open(os.path.join(static_root, 'tests', 'styles', 'base.css.gz'), 'wb') as fout:
+                fout.write(b'collected')
+            with open(os.path.join(static_root, MANIFEST_NAME), 'w') as fout:
+                json.dump({ 'files': { 'tests/styles/base.css': '0123456789ab' }, 'dynamic': [] }, fout)
+            with override_settings(STATIC_ROOT=static_root):
+                resp = serve_static(factory.get('/'), 'tests', 'styles/base.css')
+                self.assertEqual(resp['ETag'], '"0123456789ab"')
+                self.assertEqual(b''.join(resp.streaming_content), b'collected')
+                resp = serve_static(factory.get('/', HTTP_ACCEPT_ENCODING='gzip, deflate'), 'tests', 'styles/base.css')
+                self.assertEqual(resp['ETag'], '"0123456789ab-gz"')
+                self.assertEqual(resp['Content-Encoding'], 'gzip')
+                self.assertEqual(resp['Content-Type'], 'text/css')
+                self.assertEqual(gzip.decompress(b''.join(resp.streaming_content)), b'collected')
+                # not when the client refuses gzip
+                for accept in ( 'gzip;q=0, deflate', 'deflate', '*;q=0' ):
+                    resp = serve_static(factory.get('/', HTTP_ACCEPT_ENCODING=accept), 'tests', 'styles/base.css')
+                    self.assertFalse(resp.has_header('Content-Encoding'), accept)
+                self.assertTrue(serve_static(factory.get('/', HTTP_ACCEPT_ENCODING='*'), 'tests', 'styles/base.css').has_header('Content-Encoding'))
+                # bundles and promoted files are served from the bundles directory
+                name = write_hashed_file('css', b'a{color:red}', get_bundles_dir())
+                resp = serve_static(factory.get('/'), 'dmp-bundles', name)
+                self.assertEqual(b''.join(resp.streaming_content), b'a{color:red}')
+                self.assertEqual(resp['ETag'], '"%s"' % os.path.splitext(name)[0])
+                with self.assertRaises(Http404):
+                    serve_static(factory.get('/'), 'dmp-bundles', '../%s' % MANIFEST_NAME)
+        finally:
+            shutil.rmtree(static_root)
+
+
+    def test_minify_cache(self):
+        calls = []
+        def minify(text):
+            calls.append(text)
+            return text.replace(' ', '')
+        cache = MinifyCache(minify, max_size=2)
+        self.assertEqual(cache('a { color: red }'), 'a{color:red}')
+        self.assertEqual(cache('a { color: red }'), 'a{color:red}')
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(cache.stats(), { 'hits': 1, 'misses': 1, 'hit_ratio': 0.5, 'bytes_skipped': 16, 'size': 1 })
+        # the skipped text is counted in bytes, not characters
+        cache('a { content: "\u00e9" }')
+        cache('a { content: "\u00e9" }')
+        self.assertEqual(cache.stats()['bytes_skipped'], 16 + 19)
+        cache.cache.clear()
+        # the least recently used text drops out
+        cache('b { }')
+        cache('c { }')
+        self.assertEqual(cache.stats()['size'], 2)
+        cache('a { color: red }')
+        self.assertEqual(len(calls), 5)
+        # a size of 0 doesn't cache at all
+        cache = MinifyCache(minify, max_size=0)
+        self.assertEqual(cache('a { color: red }'), 'a{color:red}')
+        self.assertEqual(cache('a { color: red }'), 'a{color:red}')
+        self.assertEqual(len(calls), 7)
+        self.assertEqual(cache.stats()['size'], 0)
@@ -0,0 +1,67 @@
+from django.test import TestCase
+from django.urls import resolve, reverse
+
+from django_mako_plus.urls import match_dmp_path, urlpatterns, DMPPathPattern
+from django_mako_plus.util import log
+
+import itertools
+import logging
+
+
+# the regex patterns after the single-pass pattern
+REGEX_PATTERNS = urlpatterns[[ isinstance(p, DMPPathPattern) for p in urlpatterns ].index(True) + 1:]
+
+
+class Tester(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        # skip debug messages during testing
+        cls.loglevel = log.getEffectiveLevel()
+        log.setLevel(logging.WARNING)
+
+    @classmethod
+    def tearDownTestData(cls):
+        # set log level back to normal
+        log.setLevel(cls.loglevel)
+
+
+    def regex_match(self, path):
+        '''Resolves the path with the regex patterns only (the way DMP did before the single-pass pattern)'''
+        for pattern in REGEX_PATTERNS:
+            try:
+                rmatch = pattern.resolve(path)
+            except Exception:
+                continue
+            if rmatch is not None:
+                return rmatch.url_name, rmatch.kwargs
+        return None
+
+
+    def test_match_dmp_path(self):
+        # every combination of a few url pieces, including the odd ones
+        pieces = [ '', 'tests', 'notanapp', 'index', 'index.basic', 'index.basic.more', '.', '..', '/', '//', '-', '1', 'a-b_c', '@', '%20', 'x.' ]
+        paths = set()
+        for n in range(1, 5):
+            for combo in itertools.product(pieces, repeat=n):
+                paths.add('/'.join(combo))
+                paths.add(''.join(combo))
+        for path in sorted(paths):
+            expected = self.regex_match(path)
+            actual = match_dmp_path(path)
+            if actual is not None:
+                self.assertEqual(actual, expected, path)
+            else:
+                # only a few paths are left to the regex patterns
+                self.assertTrue('\n' in path or not path[:1].isalnum() and path[:1] not in '_-', path)
+
+
+    def test_resolve(self):
+        match = resolve('/tests/index.basic/1/2/3/')
+        self.assertEqual(match.url_name, 'DMP /app/page.function')
+        self.assertEqual(match.kwargs, { 'dmp_router_app': 'tests', 'dmp_router_page': 'index', 'dmp_router_function': 'basic', 'urlparams': '1/2/3' })
+        match = resolve('/notanapp/1/2/')
+        self.assertEqual(match.url_name, 'DMP /page')
+        self.assertEqual(match.kwargs, { 'dmp_router_page': 'notanapp', 'urlparams': '1/2' })
+        # reverse still goes through the named regex patterns
+        self.assertEqual(reverse('DMP /app/page.function', kwargs={ 'dmp_router_app': 'tests', 'dmp_router_page': 'index', 'dmp_router_function': 'basic', 'urlparams': '' }), '/tests/index.basic')
@@ -1,10 +1,11 @@
 from django.conf import settings
 from django.http import HttpResponse
 from django.views.generic import View
-from django_mako_plus import view_function
+from django_mako_plus import view_function, ModelQuery
 
 from tests.models import IceCream, MyInt
 
+from typing import List
 import decimal, datetime
 
 
@@ -39,3 +40,32 @@ class class_based(View):
 
     def post(self, request, i:int, f:float):
         return HttpResponse('Post was called.')
+
+
+###  Batched model endpoint  ###
+
+@view_function(batch_models=True)
+def batch_models(request, ic1:IceCream, ic2:IceCream, ic3:IceCream):
+    return HttpResponse('batched model conversion tests')
+
+
+###  Model query endpoint  ###
+
+@view_function(batch_models=True, model_queries={
+    'ic1': ModelQuery(field='name', only=( 'name', )),
+    'ic2': ModelQuery(field='name', only=( 'name', )),
+})
+def model_query(request, ic1:IceCream, ic2:IceCream):
+    return HttpResponse('model query tests')
+
+
+###  List endpoint  ###
+
+@view_function
+def list_testing(request, ints:List[int], ics:List[IceCream], strs:list=[]):
+    return HttpResponse('list conversion tests')
+
+
+@view_function(batch_models=True)
+def batch_list(request, ic:IceCream, ics:List[IceCream]):
+    return HttpResponse('batched list conversion tests')
@@ -6,7 +6,7 @@ from django_mako_plus import view_function
 
 from .. import dmp_render, dmp_render_to_string
 
-import datetime
+import asyncio, datetime
 
 
 
@@ -41,3 +41,19 @@ class class_based(View):
 def bad_response(request):
     return 'Should have been HttpResponse.'''
 
+
+
+###  Async endpoints  ###
+
+async def async_double(value, parameter, task):
+    await asyncio.sleep(0)
+    return int(value) * 2
+
+@view_function
+async def async_view(request, a:int, b:int=5):
+    await asyncio.sleep(0)
+    return HttpResponse('async {} {}'.format(a, b))
+
+@view_function(converter=async_double)
+async def async_converter(request, a:int, b:int):
+    return HttpResponse('async converter {} {}'.format(a, b))